@@ -0,0 +1,68 @@
+"""
+Helpers for Pyth accumulator ("PNAU") update data, the format returned by the
+Hermes v2 endpoints. One blob holds a Wormhole VAA with a merkle root followed by
+any number of price updates, each carrying its own merkle proof:
+
+    magic(4) major(1) minor(1) trailing_header_size(1) trailing_header
+    update_type(1) vaa_length(2) vaa
+    num_updates(1) [message_size(2) message num_proofs(1) proof(20)*]*
+
+A price feed message starts with message_type(1) feed_id(32).
+"""
+
+ACCUMULATOR_MAGIC = b"PNAU"
+PROOF_SIZE = 20
+
+
+def to_bytes(update_data):
+    if isinstance(update_data, str):
+        if update_data.startswith("0x"):
+            update_data = update_data[2:]
+        return bytes.fromhex(update_data)
+    return bytes(update_data)
+
+
+def is_accumulator_update(data):
+    return len(data) > 4 and data[:4] == ACCUMULATOR_MAGIC
+
+
+def _updates_offset(data):
+    offset = 7 + data[6]
+    # update_type
+    offset += 1
+    vaa_length = int.from_bytes(data[offset : offset + 2], "big")
+    return offset + 2 + vaa_length
+
+
+def get_num_updates(update_data):
+    """Number of price updates the Pyth contract charges for in one update blob"""
+    data = to_bytes(update_data)
+    if not is_accumulator_update(data):
+        return 1
+    return data[_updates_offset(data)]
+
+
+def split_by_feed(update_data):
+    """
+    Splits an accumulator blob into one blob per price feed. Every update is
+    verified on its own against the merkle root in the VAA, so each part is a
+    valid update carrying only its feed, and is charged as a single update.
+    :return: {feed_id: bytes} with 0x-prefixed lowercase feed ids
+    """
+    data = to_bytes(update_data)
+    offset = _updates_offset(data)
+    prefix = data[:offset]
+    num_updates = data[offset]
+    offset += 1
+
+    updates = {}
+    for _ in range(num_updates):
+        start = offset
+        message_size = int.from_bytes(data[offset : offset + 2], "big")
+        offset += 2
+        feed_id = "0x" + data[offset + 1 : offset + 33].hex()
+        offset += message_size
+        num_proofs = data[offset]
+        offset += 1 + num_proofs * PROOF_SIZE
+        updates[feed_id] = prefix + b"\x01" + data[start:offset]
+    return updates
@@ -0,0 +1,55 @@
+"""
+Registry of the assets with a Pyth price feed, built once at import from the
+tables in `pyth`. Every asset gets a small integer id indexing flat lists of
+its symbol and feed id, so the per-trade path works on ints and tuple keys
+instead of formatting and splitting strings.
+
+An asset id is found from any of its names in one dict lookup: the symbol
+("BTCUSD"), the pair as returned by `assetPair` ("BTC-USD"), the Pyth symbol
+("Crypto.BTC/USD") or the feed id, as 0x-prefixed hex or as bytes.
+"""
+import sys
+
+from pyth import FEED_ID_PYTH_SYMBOL_MAPPING, PYTH_SYMBOL_MAPPING
+
+
+class AssetRegistry:
+    def __init__(self):
+        self.symbols = []  # asset id => "BTCUSD"
+        self.pyth_symbols = []  # asset id => "Crypto.BTC/USD"
+        self.feed_ids = []  # asset id => 0x-prefixed lowercase hex
+        self.feed_id_bytes = []  # asset id => 32 bytes
+        self.ids = {}  # any name of an asset => asset id
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def add(self, symbol, pyth_symbol, feed_id):
+        asset_id = len(self.symbols)
+        feed_id = sys.intern(feed_id.lower())
+        feed_id_bytes = bytes.fromhex(feed_id[2:])
+        self.symbols.append(sys.intern(symbol))
+        self.pyth_symbols.append(pyth_symbol)
+        self.feed_ids.append(feed_id)
+        self.feed_id_bytes.append(feed_id_bytes)
+
+        pair = pyth_symbol.split(".", 1)[-1].replace("/", "-")
+        for name in (symbol, pair, pyth_symbol, feed_id, feed_id_bytes):
+            self.ids[name] = asset_id
+        return asset_id
+
+    def get_id(self, name):
+        """:return: The asset id for any name of the asset, None if unknown"""
+        return self.ids.get(name)
+
+
+def _build_registry():
+    registry = AssetRegistry()
+    pyth_symbols = {v: k for k, v in PYTH_SYMBOL_MAPPING.items()}
+    for symbol, feed_id in FEED_ID_PYTH_SYMBOL_MAPPING.items():
+        if symbol:
+            registry.add(symbol, pyth_symbols[symbol], feed_id)
+    return registry
+
+
+asset_registry = _build_registry()
@@ -0,0 +1,100 @@
+"""
+Cost of the asset lookups: time to import `pyth` and build `asset_registry`,
+then the per-trade work of a resolve payload, formatting and splitting
+"asset%timestamp" strings and keying the update data by "asset-timestamp"
+(before) versus asset ids and (asset_id, timestamp) tuples (after).
+
+    cd app && python3 -m benchmarks.bench_asset_registry
+"""
+import os
+import subprocess
+import sys
+import time
+
+from asset_registry import asset_registry
+from pyth import FEED_ID_PYTH_SYMBOL_MAPPING
+
+TRADES = int(os.environ.get("BENCH_TRADES", 1000))
+ROUNDS = int(os.environ.get("BENCH_ROUNDS", 100))
+CONTRACTS = {
+    f"0x{i:040x}": pair
+    for i, pair in enumerate(["BTC-USD", "ETH-USD", "SOL-USD", "ARB-USD", "XAU-USD"])
+}
+START = 1_690_000_000
+
+
+def import_time(statement):
+    code = (
+        "import time; start = time.perf_counter(); "
+        f"{statement}; print(time.perf_counter() - start)"
+    )
+    output = subprocess.check_output([sys.executable, "-c", code], cwd=os.getcwd())
+    return float(output)
+
+
+def make_trades():
+    contracts = list(CONTRACTS)
+    return [
+        {
+            "queueId": i,
+            "contractAddress": contracts[i % len(contracts)],
+            "queueTimestamp": START + i % 10,
+        }
+        for i in range(TRADES)
+    ]
+
+
+def before(trades):
+    mapping = {k: v.replace("-", "") for k, v in CONTRACTS.items()}
+    _asset = lambda x: mapping[x["contractAddress"]]
+    asset_time_mapping = [
+        f"{_asset(x)}%{x['queueTimestamp']}".split("%") for x in trades
+    ]
+    price_update_data = {
+        f"{asset}-{int(timestamp)}": ["0x00"] for asset, timestamp in asset_time_mapping
+    }
+    return [
+        (
+            x["queueId"],
+            price_update_data[f"{_asset(x)}-{x['queueTimestamp']}"],
+            [FEED_ID_PYTH_SYMBOL_MAPPING[_asset(x)]],
+        )
+        for x in trades
+        if f"{_asset(x)}-{x['queueTimestamp']}" in price_update_data
+    ]
+
+
+def after(trades):
+    mapping = {k: asset_registry.get_id(v) for k, v in CONTRACTS.items()}
+    _key = lambda x: (mapping[x["contractAddress"]], int(x["queueTimestamp"]))
+    asset_time_mapping = [_key(x) for x in trades]
+    price_update_data = {key: ["0x00"] for key in asset_time_mapping}
+    return [
+        (
+            x["queueId"],
+            price_update_data[_key(x)],
+            [asset_registry.feed_id_bytes[_key(x)[0]]],
+        )
+        for x in trades
+        if _key(x) in price_update_data
+    ]
+
+
+def report(label, build_payload, trades):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        build_payload(trades)
+    elapsed = (time.perf_counter() - start) / ROUNDS / len(trades)
+    print(f"{label:>6}: {elapsed * 1e6:.3f} us per trade")
+
+
+if __name__ == "__main__":
+    print(f"import pyth: {import_time('import pyth') * 1000:.2f} ms")
+    print(
+        f"import asset_registry: {import_time('import asset_registry') * 1000:.2f} ms "
+        f"({len(asset_registry)} assets)"
+    )
+    trades = make_trades()
+    print(f"{TRADES} trades on {len(CONTRACTS)} assets")
+    report("before", before, trades)
+    report("after", after, trades)
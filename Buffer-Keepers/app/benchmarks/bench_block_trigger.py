@@ -0,0 +1,72 @@
+"""
+Time from a block landing to the next keeper round, with the bots woken up by
+the newHeads subscription, by the eth_blockNumber polling it falls back to once
+the subscription is refused, and by the DELAY timer alone. Blocks are produced
+every BLOCK_TIME seconds by a local fake node.
+
+    cd app && python3 -m benchmarks.bench_block_trigger
+"""
+import asyncio
+import os
+import statistics
+import threading
+import time
+
+from benchmarks.fakes import FakeJSONRPCServer, FakeNewHeadsServer
+
+BLOCK_TIME = float(os.environ.get("BENCH_BLOCK_TIME", 0.25))
+BLOCKS = int(os.environ.get("BENCH_BLOCKS", 40))
+DELAY = 2
+
+
+def produce_blocks(node, ws, blocks, phase):
+    for _ in range(BLOCKS):
+        time.sleep(BLOCK_TIME)
+        node.block_number += 1
+        blocks.append((phase, time.time()))
+        ws.emit_block(node.block_number)
+
+
+def report(blocks, rounds):
+    latencies = {}
+    for phase, landed_at in blocks:
+        next_round = min((x for x in rounds if x >= landed_at), default=None)
+        if next_round is not None:
+            latencies.setdefault(phase, []).append(next_round - landed_at)
+    for phase, values in latencies.items():
+        print(
+            f"{phase:>9}: median {statistics.median(values) * 1000:7.1f} ms, "
+            f"max {max(values) * 1000:7.1f} ms over {len(values)} blocks"
+        )
+
+
+if __name__ == "__main__":
+    with FakeJSONRPCServer() as node, FakeNewHeadsServer() as ws:
+        os.environ["RPC"] = node.url
+        os.environ["DELAY"] = str(DELAY)
+        from runtime import KeeperRuntime
+        from triggers import NewBlockTrigger
+
+        blocks, rounds = [], []
+        runtime = KeeperRuntime(
+            "bench",
+            {"open": lambda environment: rounds.append(time.time())},
+            triggers=[NewBlockTrigger("bench", ws_url=ws.url)],
+        )
+
+        def scenario():
+            time.sleep(1)
+            produce_blocks(node, ws, blocks, "newHeads")
+            ws.refuse_subscriptions = True
+            ws.drop()
+            # Let the subscription attempts fail and polling take over
+            time.sleep(5)
+            produce_blocks(node, ws, blocks, "polling")
+            runtime.loop.call_soon_threadsafe(runtime.stop)
+
+        threading.Thread(target=scenario, daemon=True).start()
+        asyncio.run(runtime.main())
+
+        # DELAY alone wakes up the bot at a random point of the interval
+        print(f"{'timer':>9}: median {DELAY / 2 * 1000:7.1f} ms (DELAY={DELAY}s)")
+        report(blocks, rounds)
@@ -0,0 +1,80 @@
+"""
+Calldata of a resolveQueuedTrades batch whose trades were queued on a few assets
+in the same second: canonical ABI encoding with one copy of the update per
+trade (before) versus `calldata.encode_payload` writing each update once
+(after). Sizes, calldata gas (16 per non-zero byte, 4 per zero byte) and
+encoding time, plus the running estimate `calldata.CalldataBuilder` keeps while
+adding the items against the calldata it builds.
+
+    cd app && python3 -m benchmarks.bench_calldata
+"""
+import os
+import time
+
+from benchmarks.fakes import fake_accumulator_update
+from calldata import (
+    ITEM_TYPES,
+    SELECTORS,
+    CalldataBuilder,
+    calldata_gas,
+    encode_payload,
+)
+from eth_abi import encode_abi
+
+TRADES = int(os.environ.get("BENCH_TRADES", 40))
+ASSETS = int(os.environ.get("BENCH_ASSETS", 2))
+ROUNDS = int(os.environ.get("BENCH_ROUNDS", 200))
+PUBLISH_TIME = 1_690_000_000
+
+
+def make_payload():
+    feed_ids = ["0x" + f"{i + 1:064x}" for i in range(ASSETS)]
+    updates = {
+        feed_id: ["0x" + fake_accumulator_update([feed_id], PUBLISH_TIME).hex()]
+        for feed_id in feed_ids
+    }
+    return [
+        (queue_id, updates[feed_id], [feed_id])
+        for queue_id, feed_id in enumerate(feed_ids[i % ASSETS] for i in range(TRADES))
+    ]
+
+
+def canonical(payload):
+    item_type = f"({','.join(ITEM_TYPES['resolveQueuedTrades'])})[]"
+    items = [
+        (
+            queue_id,
+            [bytes.fromhex(x[2:]) for x in updates],
+            [bytes.fromhex(x[2:]) for x in price_ids],
+        )
+        for queue_id, updates, price_ids in payload
+    ]
+    return SELECTORS["resolveQueuedTrades"] + encode_abi([item_type], [items])
+
+
+def report(label, encode, payload):
+    calldata = encode(payload)
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        encode(payload)
+    elapsed = (time.perf_counter() - start) / ROUNDS
+    print(
+        f"{label:>6}: {len(calldata):7d} bytes, {calldata_gas(calldata):8d} "
+        f"calldata gas, {elapsed * 1000:7.3f} ms"
+    )
+
+
+if __name__ == "__main__":
+    payload = make_payload()
+    print(f"{TRADES} trades on {ASSETS} assets queued in the same second")
+    report("before", canonical, payload)
+    report("after", lambda x: encode_payload("resolveQueuedTrades", x), payload)
+
+    builder = CalldataBuilder("resolveQueuedTrades")
+    for item in payload:
+        builder.add(item)
+    calldata = builder.build()
+    print(
+        f"builder: {builder.num_bytes} bytes and ~{builder.gas} gas estimated, "
+        f"{len(calldata)} bytes and {calldata_gas(calldata)} gas built"
+    )
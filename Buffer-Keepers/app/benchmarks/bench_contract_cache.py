@@ -0,0 +1,51 @@
+"""
+Per-option overhead of building the `options` call in `unlock_options`: parsing
+the ABI and building a web3 contract for every option (before) versus the shared
+ABI and contract registry (after). No RPC is made, only calldata is encoded.
+
+    cd app && python3 -m benchmarks.bench_contract_cache
+"""
+import json
+import os
+import time
+
+import contract
+from utility import get_web3
+
+OPTIONS = int(os.environ.get("BENCH_OPTIONS", 2000))
+ENVIRONMENT = "bench"
+RPC_URL = "http://127.0.0.1:8545"
+OPTIONS_CONTRACT = "0x000000000000000000000000000000000000bEEF"
+OPTIONS_ABI = "./abis/BufferOptions.json"
+
+
+def before(option_id):
+    with open(OPTIONS_ABI) as f:
+        abi = json.load(f)
+    web3_contract = get_web3(ENVIRONMENT, RPC_URL).eth.contract(
+        address=OPTIONS_CONTRACT, abi=abi
+    )
+    return web3_contract.functions.options(option_id)._encode_transaction_data()
+
+
+def after(option_id):
+    return (
+        contract.get(OPTIONS_CONTRACT, ENVIRONMENT, OPTIONS_ABI)
+        .f("options", option_id)
+        ._encode_transaction_data()
+    )
+
+
+def run(label, f):
+    start = time.time()
+    for option_id in range(OPTIONS):
+        f(option_id)
+    elapsed = time.time() - start
+    print(f"{label:>6}: {elapsed / OPTIONS * 1e6:8.1f} us per option")
+
+
+if __name__ == "__main__":
+    os.environ["RPC"] = RPC_URL
+    assert before(1) == after(1)
+    run("before", before)
+    run("after", after)
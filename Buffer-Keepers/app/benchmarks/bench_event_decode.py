@@ -0,0 +1,103 @@
+"""
+Decoding a large synthetic BufferOptions receipt: the per-log path that copied
+the log, rebuilt the topics and went through web3's `get_event_data` (before)
+versus the precompiled topic table of `services.event_service` (after).
+
+    cd app && python3 -m benchmarks.bench_event_decode
+"""
+import os
+import random
+import time
+
+from eth_abi import encode_abi
+from hexbytes import HexBytes
+from services.web3_service import Contract
+from web3 import Web3
+from web3._utils.events import get_event_data
+
+LOGS = int(os.environ.get("BENCH_LOGS", 5000))
+ENVIRONMENT = "bench"
+OPTIONS_CONTRACT = "0x000000000000000000000000000000000000bEEF"
+OPTIONS_ABI = "./abis/BufferOptions.json"
+ACCOUNT = "0x000000000000000000000000000000000000dEaD"
+
+
+def encode_topic(abi_type, value):
+    return HexBytes(encode_abi([abi_type], [value]))
+
+
+def make_log(contract, event_name, values, log_index):
+    event_abi = contract.get_event_abi(event_name)
+    topics = [HexBytes(contract.get_topic(event_name))]
+    data_types, data_values = [], []
+    for x, value in zip(event_abi["inputs"], values):
+        if x["indexed"]:
+            topics.append(encode_topic(x["type"], value))
+        else:
+            data_types.append(x["type"])
+            data_values.append(value)
+    return {
+        "address": OPTIONS_CONTRACT,
+        "topics": topics,
+        "data": HexBytes(encode_abi(data_types, data_values)).hex(),
+        "logIndex": log_index,
+        "transactionIndex": 0,
+        "transactionHash": HexBytes(b"\x11" * 32),
+        "blockHash": HexBytes(b"\x22" * 32),
+        "blockNumber": 1,
+    }
+
+
+def make_receipt(contract):
+    random.seed(0)
+    logs = []
+    for log_index in range(LOGS):
+        option_id = random.randrange(1 << 32)
+        price = random.randrange(1 << 40)
+        event_name, values = random.choice(
+            [
+                ("Create", [ACCOUNT, option_id, 0, price, price]),
+                ("Expire", [option_id, price, price]),
+                ("Exercise", [ACCOUNT, option_id, price, price]),
+            ]
+        )
+        logs.append(make_log(contract, event_name, values, log_index))
+    return logs
+
+
+def before(contract, logs):
+    topic_to_event_name = {
+        contract.get_topic(event_name): event_name
+        for event_name in contract.get_all_event_names()
+    }
+    events = {}
+    for log in logs:
+        data = dict(log)
+        data["topics"] = list(map(HexBytes, data["topics"]))
+        event_name = topic_to_event_name[data["topics"][0].hex()]
+        decoded_event = get_event_data(
+            Web3().codec, contract.get_event_abi(event_name), data
+        )
+        events.setdefault(event_name, []).append(decoded_event["args"])
+    return events
+
+
+def after(contract, logs):
+    return contract.decode_txn(logs)
+
+
+def run(label, f, contract, logs):
+    start = time.time()
+    events = f(contract, logs)
+    elapsed = time.time() - start
+    print(f"{label:>6}: {elapsed / len(logs) * 1e6:8.1f} us per log")
+    return events
+
+
+if __name__ == "__main__":
+    options = Contract(OPTIONS_CONTRACT, OPTIONS_ABI, ENVIRONMENT)
+    receipt = make_receipt(options)
+    print(f"{len(receipt)} logs")
+    assert run("before", before, options, receipt) == run(
+        "after", after, options, receipt
+    )
@@ -0,0 +1,52 @@
+"""
+Time to get the VAAs of trades queued in the last seconds with
+`get_vaa_for_a_specific_time`, from the historical endpoint versus from the
+store filled by the Hermes price stream, against a local fake Hermes answering
+requests in LATENCY seconds.
+
+    cd app && python3 -m benchmarks.bench_price_stream
+"""
+import os
+import time
+
+from asset_registry import asset_registry
+from benchmarks.fakes import FakeHermesServer
+
+LATENCY = float(os.environ.get("BENCH_LATENCY", 0.1))
+ASSETS = ["BTCUSD", "ETHUSD", "SOLUSD", "ARBUSD"]
+WARM_UP = 3
+
+
+def fetch_recent(get_vaa_for_a_specific_time, seconds):
+    now = int(time.time())
+    start = time.time()
+    for asset in ASSETS:
+        asset_id = asset_registry.get_id(asset)
+        for timestamp in range(now - seconds, now - 1):
+            get_vaa_for_a_specific_time(asset_id, timestamp, "bench")
+    return time.time() - start
+
+
+if __name__ == "__main__":
+    with FakeHermesServer(latency=lambda path, query: LATENCY) as server:
+        os.environ["PYTH_ENDPOINT"] = server.url
+        from data_v2 import get_vaa_for_a_specific_time
+        from price_stream import HermesPriceStream
+        from vaa_store import vaa_store
+
+        elapsed = fetch_recent(get_vaa_for_a_specific_time, WARM_UP)
+        print(
+            f"historical: {elapsed:.3f}s, {server.requests} hermes requests "
+            f"for {len(ASSETS)} assets over {WARM_UP - 1}s"
+        )
+
+        stream = HermesPriceStream("bench", ",".join(ASSETS)).start()
+        time.sleep(WARM_UP)
+        requests_before = server.requests
+        elapsed = fetch_recent(get_vaa_for_a_specific_time, WARM_UP)
+        print(
+            f"stream: {elapsed:.3f}s, {server.requests - requests_before} hermes "
+            f"requests, {server.events} stream events"
+        )
+        print(f"store: {vaa_store.get_stats()}, stream: {stream.get_stats()}")
+        stream.stop()
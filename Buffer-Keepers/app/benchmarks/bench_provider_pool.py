@@ -0,0 +1,76 @@
+"""
+eth_call latency percentiles against nodes with a slow tail (SLOW_SHARE of the
+calls take SLOW_LATENCY seconds): one node on its own, then three of them behind
+the hedging ProviderPool. Then the number of nodes a raw txn reaches.
+
+    cd app && python3 -m benchmarks.bench_provider_pool
+"""
+import os
+import random
+import statistics
+import time
+
+from benchmarks.fakes import FakeJSONRPCServer
+from utility import get_web3
+
+CALLS = int(os.environ.get("BENCH_CALLS", 300))
+LATENCY = 0.01
+SLOW_LATENCY = float(os.environ.get("BENCH_SLOW_LATENCY", 1))
+SLOW_SHARE = 0.1
+CALL = {"to": "0x000000000000000000000000000000000000bEEF", "data": "0x"}
+
+
+def eth_call(slow_share):
+    def call(params):
+        slow = random.random() < slow_share
+        time.sleep(SLOW_LATENCY if slow else LATENCY)
+        return "0x" + "00" * 32
+
+    return call
+
+
+def send_raw_transaction(node):
+    def send(params):
+        node.received_txns += 1
+        return "0x" + "11" * 32
+
+    return send
+
+
+def run(label, web3):
+    latencies = []
+    for _ in range(CALLS):
+        start = time.time()
+        web3.eth.call(CALL)
+        latencies.append(time.time() - start)
+    latencies.sort()
+    print(
+        f"{label:>7}: p50 {statistics.median(latencies) * 1000:7.1f} ms, "
+        f"p99 {latencies[int(0.99 * (CALLS - 1))] * 1000:7.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    nodes = [
+        FakeJSONRPCServer(methods={"eth_call": eth_call(SLOW_SHARE)}),
+        FakeJSONRPCServer(methods={"eth_call": eth_call(SLOW_SHARE)}),
+        FakeJSONRPCServer(methods={"eth_call": eth_call(SLOW_SHARE)}),
+    ]
+    for node in nodes:
+        node.received_txns = 0
+        node.methods["eth_sendRawTransaction"] = send_raw_transaction(node)
+        node.__enter__()
+    try:
+        run("single", get_web3("bench", nodes[0].url))
+
+        pooled_web3 = get_web3("bench", ",".join(node.url for node in nodes))
+        run("pooled", pooled_web3)
+
+        pooled_web3.eth.send_raw_transaction("0x" + "22" * 100)
+        time.sleep(0.1)
+        reached = sum(node.received_txns for node in nodes)
+        print(f"raw txn reached {reached}/{len(nodes)} nodes")
+    finally:
+        for node in nodes:
+            node.__exit__()
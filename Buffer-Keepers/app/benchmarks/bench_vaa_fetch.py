@@ -0,0 +1,61 @@
+"""
+End-to-end time to fetch the VAAs of a batch of distinct timestamps, one request
+after the other versus the concurrent `get_vaas`, against a local fake Hermes
+that answers in LATENCY seconds and takes SLOW_LATENCY for one of the timestamps.
+Then the number of Hermes requests for a batch of assets sharing one timestamp.
+
+    cd app && python3 -m benchmarks.bench_vaa_fetch
+"""
+import os
+import time
+
+from asset_registry import asset_registry
+from benchmarks.fakes import FakeHermesServer
+
+BATCH = int(os.environ.get("BENCH_BATCH", 50))
+LATENCY = float(os.environ.get("BENCH_LATENCY", 0.05))
+SLOW_LATENCY = float(os.environ.get("BENCH_SLOW_LATENCY", 10))
+START = 1_690_000_000
+
+
+def latency(path, query):
+    publish_time = query.get("publish_time", [path.rsplit("/", 1)[1]])[0]
+    if int(publish_time) == START:
+        return SLOW_LATENCY
+    return LATENCY
+
+
+if __name__ == "__main__":
+    with FakeHermesServer(latency=latency) as server:
+        os.environ["PYTH_ENDPOINT"] = server.url
+        from data_v2 import get_vaa_for_a_specific_time, get_vaas
+
+        btc = asset_registry.get_id("BTCUSD")
+        asset_time_mapping = [(btc, START + i) for i in range(BATCH)]
+
+        start = time.time()
+        fetched = 0
+        for asset_id, timestamp in asset_time_mapping[1:]:
+            get_vaa_for_a_specific_time(asset_id, timestamp, "bench")
+            fetched += 1
+        print(
+            f"sequential: {time.time() - start:.2f}s for {fetched} vaas "
+            f"(skipping the slow timestamp)"
+        )
+
+        start = time.time()
+        vaas = get_vaas(asset_time_mapping, "bench")
+        print(
+            f"concurrent: {time.time() - start:.2f}s for {len(vaas)}/{BATCH} vaas "
+            f"(slow timestamp left out after the batch deadline)"
+        )
+
+        assets = ["BTCUSD", "ETHUSD", "SOLUSD", "ARBUSD", "XAUUSD", "EURUSD"]
+        requests_before = server.requests
+        vaas = get_vaas(
+            [(asset_registry.get_id(asset), START + 1) for asset in assets], "bench"
+        )
+        print(
+            f"same second: {server.requests - requests_before} hermes requests "
+            f"for {len(vaas)} assets"
+        )
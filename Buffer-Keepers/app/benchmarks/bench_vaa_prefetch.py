@@ -0,0 +1,47 @@
+"""
+Time to get the updates of trades queued in the last seconds, with the
+speculative prefetcher keeping the active assets warm versus fetching them on
+demand, against a local fake Hermes answering in LATENCY seconds.
+
+    cd app && python3 -m benchmarks.bench_vaa_prefetch
+"""
+import os
+import time
+
+from asset_registry import asset_registry
+from benchmarks.fakes import FakeHermesServer
+
+LATENCY = float(os.environ.get("BENCH_LATENCY", 0.1))
+ASSETS = ["BTCUSD", "ETHUSD", "SOLUSD", "ARBUSD"]
+WARM_UP = 3
+
+
+if __name__ == "__main__":
+    with FakeHermesServer(latency=lambda path, query: LATENCY) as server:
+        os.environ["PYTH_ENDPOINT"] = server.url
+        from data_v2 import get_vaas
+        from vaa_prefetch import SpeculativePrefetcher
+        from vaa_store import vaa_store
+
+        now = int(time.time())
+        queued = [(asset_registry.get_id(asset), now - 1) for asset in ASSETS]
+        start = time.time()
+        vaas = get_vaas(queued, "bench")
+        print(
+            f"on demand: {time.time() - start:.3f}s for {len(vaas)} vaas, "
+            f"{server.requests} hermes requests"
+        )
+
+        prefetcher = SpeculativePrefetcher("bench", ",".join(ASSETS)).start()
+        time.sleep(WARM_UP)
+        now = int(time.time())
+        queued = [(asset_registry.get_id(asset), now - 2) for asset in ASSETS]
+        requests_before = server.requests
+        start = time.time()
+        vaas = get_vaas(queued, "bench")
+        print(
+            f"prefetched: {time.time() - start:.3f}s for {len(vaas)} vaas, "
+            f"{server.requests - requests_before} hermes requests"
+        )
+        print(f"store: {vaa_store.get_stats()}")
+        prefetcher.stop()
@@ -0,0 +1,44 @@
+"""
+RPC calls/sec with a fresh HTTPProvider per call (the old `get_web3`) versus
+the shared client registry, against a local JSON-RPC stand-in.
+
+    cd app && python3 -m benchmarks.bench_web3_client
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fakes import FakeJSONRPCServer
+from utility import get_web3
+from web3 import Web3
+from web3.middleware import geth_poa_middleware
+from web3.providers.rpc import HTTPProvider
+
+CALLS = int(os.environ.get("BENCH_CALLS", 2000))
+THREADS = int(os.environ.get("BENCH_THREADS", 8))
+
+
+def fresh_web3(rpc_url):
+    provider = HTTPProvider(rpc_url, request_kwargs={"timeout": 10})
+    provider.middlewares.clear()
+    web3 = Web3(provider)
+    web3.middleware_onion.inject(geth_poa_middleware, layer=0)
+    return web3
+
+
+def run(label, server, make_web3):
+    start_connections = server.connections
+    start = time.time()
+    with ThreadPoolExecutor(THREADS) as executor:
+        list(executor.map(lambda _: make_web3().eth.block_number, range(CALLS)))
+    elapsed = time.time() - start
+    print(
+        f"{label:>8}: {CALLS / elapsed:8.1f} calls/sec, "
+        f"{server.connections - start_connections} connections opened"
+    )
+
+
+if __name__ == "__main__":
+    with FakeJSONRPCServer() as server:
+        run("before", server, lambda: fresh_web3(server.url))
+        run("after", server, lambda: get_web3("bench", server.url))
@@ -0,0 +1,317 @@
+"""
+Local stand-ins for the external services the keepers talk to, used by the
+scripts in this package. Every server binds to 127.0.0.1 on a free port and runs
+on a daemon thread.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import websockets
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, handler_class, state):
+        super().__init__(("127.0.0.1", 0), handler_class)
+        self.state = state
+        self.connections = 0
+        self.requests = 0
+        self._counter_lock = threading.Lock()
+
+    def count(self, field):
+        with self._counter_lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so that clients can keep connections alive
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.count("connections")
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeServer:
+    handler_class = _Handler
+
+    def __init__(self):
+        self.httpd = _Server(self.handler_class, self)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    @property
+    def connections(self):
+        return self.httpd.connections
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _JSONRPCHandler(_Handler):
+    def do_POST(self):
+        self.server.count("requests")
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        request = json.loads(body)
+        if isinstance(request, list):
+            self.send_json([self.server.state.dispatch(r) for r in request])
+        else:
+            self.send_json(self.server.state.dispatch(request))
+
+
+class FakeJSONRPCServer(FakeServer):
+    """
+    Minimal JSON-RPC node. `methods` maps an RPC method name to a callable taking
+    the request params and returning the `result` field; an exception raised by
+    the callable is returned as a JSON-RPC error.
+    """
+
+    handler_class = _JSONRPCHandler
+
+    def __init__(self, chain_id=421613, block_number=1, methods=None):
+        super().__init__()
+        self.chain_id = chain_id
+        self.block_number = block_number
+        self.methods = {
+            "eth_chainId": lambda params: hex(self.chain_id),
+            "net_version": lambda params: str(self.chain_id),
+            "eth_blockNumber": lambda params: hex(self.block_number),
+            "eth_call": lambda params: "0x" + "00" * 32,
+            **(methods or {}),
+        }
+
+    def dispatch(self, request):
+        method = self.methods.get(request["method"])
+        if method is None:
+            return {
+                "jsonrpc": "2.0",
+                "id": request["id"],
+                "error": {"code": -32601, "message": "Method not found"},
+            }
+        try:
+            result = method(request.get("params", []))
+        except Exception as e:
+            return {
+                "jsonrpc": "2.0",
+                "id": request["id"],
+                "error": {"code": -32000, "message": str(e)},
+            }
+        return {"jsonrpc": "2.0", "id": request["id"], "result": result}
+
+
+def fake_vaa(feed_id, publish_time):
+    """Deterministic stand-in for the VAA of a feed at a publish time"""
+    return hashlib.sha256(f"{feed_id}-{publish_time}".encode()).digest() * 4
+
+
+def fake_accumulator_update(feed_ids, publish_time):
+    """Accumulator ("PNAU") blob carrying one fake price message per feed"""
+    vaa = hashlib.sha256(f"root-{publish_time}".encode()).digest() * 4
+    data = b"PNAU" + bytes([1, 0, 0, 0]) + len(vaa).to_bytes(2, "big") + vaa
+    data += bytes([len(feed_ids)])
+    for feed_id in feed_ids:
+        message = (
+            b"\x00"
+            + bytes.fromhex(feed_id[2:] if feed_id.startswith("0x") else feed_id)
+            + publish_time.to_bytes(8, "big") * 4
+        )
+        proof = hashlib.sha256(message).digest()[:20]
+        data += len(message).to_bytes(2, "big") + message + b"\x01" + proof
+    return data
+
+
+class _HermesHandler(_Handler):
+    def do_GET(self):
+        self.server.count("requests")
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        hermes = self.server.state
+        time.sleep(hermes.latency(url.path, query))
+        if url.path == "/api/get_vaa":
+            feed_id = query["id"][0]
+            publish_time = int(query["publish_time"][0])
+            self.send_json(
+                {
+                    "vaa": base64.b64encode(fake_vaa(feed_id, publish_time)).decode(),
+                    "publishTime": publish_time,
+                }
+            )
+        elif url.path == "/v2/updates/price/stream":
+            self.stream_updates(query["ids[]"])
+        elif url.path.startswith("/v2/updates/price/"):
+            publish_time = int(url.path.rsplit("/", 1)[1])
+            update = fake_accumulator_update(query["ids[]"], publish_time)
+            self.send_json({"binary": {"encoding": "hex", "data": [update.hex()]}})
+        else:
+            self.send_json({"detail": "Not Found"}, status=404)
+
+    def stream_updates(self, feed_ids):
+        """Server-sent events with an update of `feed_ids` every stream_interval"""
+        hermes = self.server.state
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        generation = hermes.stream_generation
+        try:
+            while generation == hermes.stream_generation:
+                publish_time = int(time.time())
+                update = fake_accumulator_update(feed_ids, publish_time)
+                event = {
+                    "binary": {"encoding": "hex", "data": [update.hex()]},
+                    "parsed": [
+                        {
+                            "id": feed_id[2:] if feed_id.startswith("0x") else feed_id,
+                            "price": {"publish_time": publish_time},
+                        }
+                        for feed_id in feed_ids
+                    ],
+                }
+                self.wfile.write(f"data:{json.dumps(event)}\n\n".encode())
+                self.wfile.flush()
+                hermes.events += 1
+                time.sleep(hermes.stream_interval)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class FakeHermesServer(FakeServer):
+    """
+    Hermes stand-in. `latency` is a callable (path, query) => seconds to sleep
+    before answering, used to inject slow requests. The price stream sends an
+    event every `stream_interval` seconds and `drop_streams` closes the open ones.
+    """
+
+    handler_class = _HermesHandler
+
+    def __init__(self, latency=None, stream_interval=0.4):
+        super().__init__()
+        self.latency = latency or (lambda path, query: 0)
+        self.stream_interval = stream_interval
+        self.stream_generation = 0
+        self.events = 0
+
+    def drop_streams(self):
+        self.stream_generation += 1
+
+
+class FakeNewHeadsServer:
+    """
+    WebSocket node serving the `newHeads` subscription. `emit_block` pushes a
+    head to every subscriber and `drop` closes their connections. While
+    `refuse_subscriptions` is set, `eth_subscribe` is answered with an error.
+    """
+
+    subscription_id = "0x9cef478923ff08bf67fde6c64013158d"
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.server = None
+        self.subscribers = set()
+        self.refuse_subscriptions = False
+
+    @property
+    def url(self):
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f"ws://{host}:{port}"
+
+    async def _handler(self, websocket, path=None):
+        try:
+            async for message in websocket:
+                request = json.loads(message)
+                if (
+                    request["method"] != "eth_subscribe"
+                    or request["params"] != ["newHeads"]
+                    or self.refuse_subscriptions
+                ):
+                    response = {"error": {"code": -32601, "message": "Unavailable"}}
+                else:
+                    self.subscribers.add(websocket)
+                    response = {"result": self.subscription_id}
+                await websocket.send(
+                    json.dumps({"jsonrpc": "2.0", "id": request["id"], **response})
+                )
+        finally:
+            self.subscribers.discard(websocket)
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    async def _broadcast(self, message):
+        await asyncio.gather(
+            *[websocket.send(message) for websocket in list(self.subscribers)],
+            return_exceptions=True,
+        )
+
+    def emit_block(self, block_number):
+        head = {
+            "number": hex(block_number),
+            "hash": "0x" + hashlib.sha256(str(block_number).encode()).hexdigest(),
+            "timestamp": hex(int(time.time())),
+        }
+        message = json.dumps(
+            {
+                "jsonrpc": "2.0",
+                "method": "eth_subscription",
+                "params": {"subscription": self.subscription_id, "result": head},
+            }
+        )
+        self._run(self._broadcast(message))
+
+    async def _drop(self):
+        await asyncio.gather(
+            *[websocket.close() for websocket in list(self.subscribers)],
+            return_exceptions=True,
+        )
+
+    def drop(self):
+        self._run(self._drop())
+
+    async def _serve(self):
+        return await websockets.serve(self._handler, "127.0.0.1", 0)
+
+    async def _close(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    def __enter__(self):
+        self.thread.start()
+        self.server = self._run(self._serve())
+        return self
+
+    def __exit__(self, *args):
+        self._run(self._close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
@@ -0,0 +1,145 @@
+"""
+Parity check between `cached_multicall` and one `read` per call for the
+`queuedTrades` and `options` reads done by the keepers, against a local chain
+stand-in that emulates the Multicall, Router and BufferOptions contracts.
+
+    cd app && python3 -m benchmarks.multicall_parity
+"""
+import os
+
+from benchmarks.fakes import FakeJSONRPCServer
+from config import MULTICALL, ROUTER
+from eth_abi import decode_abi, encode_abi
+from web3 import Web3
+
+ENVIRONMENT = "arb-sandbox"
+OPTIONS_CONTRACT = "0x000000000000000000000000000000000000bEEF"
+USER = "0x000000000000000000000000000000000000dEaD"
+
+
+def selector(signature):
+    return Web3.keccak(text=signature)[:4]
+
+
+QUEUED_TRADE_TYPES = [
+    "uint256",
+    "uint256",
+    "address",
+    "uint256",
+    "uint256",
+    "bool",
+    "address",
+    "uint256",
+    "uint256",
+    "uint256",
+    "bool",
+    "uint256",
+    "uint256",
+]
+OPTION_TYPES = [
+    "uint8",
+    "uint256",
+    "uint256",
+    "uint256",
+    "uint256",
+    "uint256",
+    "bool",
+    "uint256",
+    "uint256",
+]
+
+
+def queued_trade(queue_id):
+    is_above = queue_id % 2 == 0
+    is_queued = queue_id % 3 != 0
+    queued_time = 1_690_000_000 + queue_id
+    return QUEUED_TRADE_TYPES, [
+        queue_id,
+        0,
+        USER,
+        10**6,
+        300,
+        is_above,
+        OPTIONS_CONTRACT,
+        2 * 10**8,
+        100,
+        queued_time,
+        is_queued,
+        0,
+        0,
+    ]
+
+
+def option(option_id):
+    state = 1 + option_id % 2
+    return OPTION_TYPES, [
+        state,
+        2 * 10**8,
+        10**6,
+        10**6,
+        10**5,
+        1_690_000_300,
+        True,
+        10**6,
+        1_690_000_000,
+    ]
+
+
+class FakeChain:
+    def __init__(self, fail_aggregate=False):
+        self.fail_aggregate = fail_aggregate
+        self.aggregate_calls = 0
+        self.single_calls = 0
+        self.functions = {
+            (
+                ROUTER[ENVIRONMENT].lower(),
+                selector("queuedTrades(uint256)"),
+            ): queued_trade,
+            (OPTIONS_CONTRACT.lower(), selector("options(uint256)")): option,
+        }
+
+    def call(self, target, data):
+        types, values = self.functions[(target.lower(), data[:4])](
+            decode_abi(["uint256"], data[4:])[0]
+        )
+        return encode_abi(types, values)
+
+    def eth_call(self, params):
+        target = params[0]["to"]
+        data = bytes.fromhex(params[0]["data"][2:])
+        if target.lower() == MULTICALL[ENVIRONMENT].lower():
+            self.aggregate_calls += 1
+            if self.fail_aggregate:
+                raise ValueError("execution reverted")
+            (calls,) = decode_abi(["(address,bytes)[]"], data[4:])
+            results = [self.call(target, data) for target, data in calls]
+            return "0x" + encode_abi(["uint256", "bytes[]"], [1, results]).hex()
+        self.single_calls += 1
+        return "0x" + self.call(target, data).hex()
+
+
+def check(fail_aggregate):
+    chain = FakeChain(fail_aggregate=fail_aggregate)
+    with FakeJSONRPCServer(methods={"eth_call": chain.eth_call}) as server:
+        os.environ["RPC"] = server.url
+        from multicall import test_cached_multicall
+
+        router_calls = [
+            (ROUTER[ENVIRONMENT], "./abis/Router.json", "queuedTrades", queue_id)
+            for queue_id in range(100)
+        ]
+        options_calls = [
+            (OPTIONS_CONTRACT, "./abis/BufferOptions.json", "options", option_id)
+            for option_id in range(100)
+        ]
+        test_cached_multicall(router_calls, ENVIRONMENT)
+        test_cached_multicall(options_calls, ENVIRONMENT)
+    print(
+        f"fail_aggregate={fail_aggregate}: parity ok, "
+        f"{chain.aggregate_calls} aggregate calls, {chain.single_calls} single calls"
+    )
+
+
+if __name__ == "__main__":
+    check(fail_aggregate=False)
+    check(fail_aggregate=True)
@@ -3,7 +3,7 @@ import os
 import redis
 
 
-def get_cache():
+def get_cache(decode_responses=True):
 
     # redis_url = f"redis://{os.environ.get('REDISUSER')}:{os.environ.get('REDISPASSWORD')}@{os.environ.get('REDISHOST')}:{}"
     try:
@@ -11,7 +11,7 @@ def get_cache():
             host=os.environ.get("REDISHOST"),
             port=os.environ.get("REDISPORT"),
             password=os.environ.get("REDISPASSWORD"),
-            decode_responses=True,
+            decode_responses=decode_responses,
         )
     except Exception:
         raise Exception(
@@ -21,3 +21,6 @@ def get_cache():
 
 
 cache = get_cache()
+
+# Same server as `cache`, but values are returned as raw bytes
+binary_cache = get_cache(decode_responses=False)
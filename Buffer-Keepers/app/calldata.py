@@ -0,0 +1,181 @@
+"""
+Calldata for the Router's batched keeper functions.
+
+CalldataBuilder ABI-encodes the items of a batch one at a time, keeping a
+running count of the calldata bytes and an estimate of the gas of the txn, and
+refuses the item that would take the batch over its limits. The calldata is
+assembled once into a buffer of the final size.
+
+Items of a batch often carry the same update, e.g. every trade of an asset
+queued in the same second. The ABI points at every `bytes` element through an
+offset, so the items reference a single copy of each distinct update written
+after all the items instead of repeating it. The Router decodes this exactly
+like the canonical encoding.
+"""
+from accumulator import to_bytes
+from eth_utils import function_signature_to_4byte_selector
+
+# function => ABI types of the fields of its items
+ITEM_TYPES = {
+    "resolveQueuedTrades": ("uint256", "bytes[]", "bytes32[]"),
+    "unlockOptions": ("uint256", "address", "bytes[]", "bytes32[]"),
+}
+SELECTORS = {
+    function_name: function_signature_to_4byte_selector(
+        f"{function_name}(({','.join(item_types)})[])"
+    )
+    for function_name, item_types in ITEM_TYPES.items()
+}
+ZERO_BYTE_GAS = 4
+NON_ZERO_BYTE_GAS = 16
+# An offset word is mostly zeros, counted as two non-zero bytes
+OFFSET_WORD_GAS = 30 * ZERO_BYTE_GAS + 2 * NON_ZERO_BYTE_GAS
+
+
+def _word(value):
+    return value.to_bytes(32, "big")
+
+
+def _padded(data):
+    return data + b"\x00" * (-len(data) % 32)
+
+
+def _encode_static(abi_type, value):
+    if abi_type == "address":
+        return b"\x00" * 12 + to_bytes(value)
+    if abi_type == "bytes32":
+        return to_bytes(value).rjust(32, b"\x00")
+    return _word(int(value))
+
+
+def calldata_gas(data):
+    zeros = data.count(0)
+    return ZERO_BYTE_GAS * zeros + NON_ZERO_BYTE_GAS * (len(data) - zeros)
+
+
+class CalldataBuilder:
+    def __init__(
+        self, function_name, max_bytes=None, max_gas=None, base_gas=0, item_gas=0
+    ):
+        """
+        :param max_bytes: calldata size the batch mustn't exceed
+        :param max_gas: gas estimate the batch mustn't exceed
+        :param base_gas: execution gas of the txn without any item
+        :param item_gas: execution gas of every item, calldata gas is added to it
+        """
+        self.function_name = function_name
+        self.item_types = ITEM_TYPES[function_name]
+        self.max_bytes = max_bytes
+        self.max_gas = max_gas
+        self.item_gas = item_gas
+
+        self.items = []
+        # (encoded item, [(position in the item, update, base of the offset)])
+        self._encoded_items = []
+        self.updates = {}  # update => position in the update area
+        self.items_size = 0
+        self.updates_size = 0
+        # Selector, offset and length of the array
+        self.gas = (
+            base_gas + calldata_gas(SELECTORS[function_name]) + 2 * OFFSET_WORD_GAS
+        )
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def num_bytes(self):
+        return 4 + 64 + 32 * len(self.items) + self.items_size + self.updates_size
+
+    def _encode_item(self, item):
+        """The item with zeros in place of the offsets of its updates"""
+        encoded = bytearray()
+        references = []
+        tail = bytearray()
+        tail_offset = 32 * len(self.item_types)
+        for abi_type, value in zip(self.item_types, item):
+            if abi_type == "bytes[]":
+                encoded += _word(tail_offset + len(tail))
+                tail += _word(len(value))
+                # Offsets of the elements are relative to the word after the length
+                base = tail_offset + len(tail)
+                for update in map(to_bytes, value):
+                    references.append((tail_offset + len(tail), update, base))
+                    tail += bytes(32)
+            elif abi_type == "bytes32[]":
+                encoded += _word(tail_offset + len(tail))
+                tail += _word(len(value))
+                for x in value:
+                    tail += _encode_static("bytes32", x)
+            else:
+                encoded += _encode_static(abi_type, value)
+        encoded += tail
+        return encoded, references
+
+    def add(self, item):
+        """
+        Adds `item` unless it would take the batch over `max_bytes` or
+        `max_gas`, returns whether it was added. The first item is always added.
+        """
+        encoded, references = self._encode_item(item)
+        new_updates = {}
+        for _, update, _ in references:
+            if update not in self.updates and update not in new_updates:
+                new_updates[update] = 32 + len(_padded(update))
+
+        added_bytes = 32 + len(encoded) + sum(new_updates.values())
+        added_gas = (
+            self.item_gas
+            + OFFSET_WORD_GAS * (1 + len(references))
+            + calldata_gas(encoded)
+            + sum(
+                OFFSET_WORD_GAS + calldata_gas(_padded(update))
+                for update in new_updates
+            )
+        )
+        if self.items and (
+            (self.max_bytes and self.num_bytes + added_bytes > self.max_bytes)
+            or (self.max_gas and self.gas + added_gas > self.max_gas)
+        ):
+            return False
+
+        for update, size in new_updates.items():
+            self.updates[update] = self.updates_size
+            self.updates_size += size
+        self.items.append(item)
+        self._encoded_items.append((encoded, references))
+        self.items_size += len(encoded)
+        self.gas += added_gas
+        return True
+
+    def build(self):
+        # Positions are relative to the start of the arguments, after the selector
+        calldata = bytearray(self.num_bytes)
+        calldata[:4] = SELECTORS[self.function_name]
+        calldata[4:68] = _word(32) + _word(len(self.items))
+
+        updates_start = 64 + 32 * len(self.items) + self.items_size
+        position = 64 + 32 * len(self.items)
+        for i, (encoded, references) in enumerate(self._encoded_items):
+            calldata[4 + 64 + 32 * i : 4 + 96 + 32 * i] = _word(position - 64)
+            calldata[4 + position : 4 + position + len(encoded)] = encoded
+            for offset, update, base in references:
+                start = 4 + position + offset
+                calldata[start : start + 32] = _word(
+                    updates_start + self.updates[update] - position - base
+                )
+            position += len(encoded)
+
+        for update, update_position in self.updates.items():
+            start = 4 + updates_start + update_position
+            calldata[start : start + 32] = _word(len(update))
+            calldata[start + 32 : start + 32 + len(update)] = update
+        return bytes(calldata)
+
+
+def encode_payload(function_name, payload):
+    """Calldata of `function_name(payload)` with no limit on its size"""
+    builder = CalldataBuilder(function_name)
+    for item in payload:
+        builder.add(item)
+    return builder.build()
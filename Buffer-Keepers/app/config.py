@@ -1,5 +1,7 @@
 import os
 
+from pyth import PYTH_SYMBOL_MAPPING
+
 ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
 
 CHAIN_ID = {
@@ -64,126 +66,15 @@ GAS_LIMIT_PER_TXN = {
     "polygon-mainnet": 5_000_000,
 }
 
-PYTH_SYMBOL_MAPPING = dict(
-    [
-        ("Crypto.1INCH/USD", "1INCHUSD"),
-        ("Crypto.AAVE/USD", "AAVEUSD"),
-        ("Crypto.ACM/USD", "ACMUSD"),
-        ("Crypto.ADA/USD", "ADAUSD"),
-        ("Crypto.ALGO/USD", "ALGOUSD"),
-        ("Crypto.ALICE/USD", "ALICEUSD"),
-        ("Crypto.ALPACA/USD", "ALPACAUSD"),
-        ("Crypto.AMP/USD", "AMPUSD"),
-        ("Crypto.ANKR/USD", "ANKRUSD"),
-        ("Crypto.APE/USD", "APEUSD"),
-        ("Crypto.APT/USD", "APTUSD"),
-        ("Crypto.ARB/USD", "ARBUSD"),
-        ("Crypto.ARG/USD", "ARGUSD"),
-        ("Crypto.ASR/USD", "ASRUSD"),
-        ("Crypto.ATLAS/USD", "ATLASUSD"),
-        ("Crypto.ATM/USD", "ATMUSD"),
-        ("Crypto.ATOM/USD", "ATOMUSD"),
-        ("Crypto.AURORA/USD", "AURORAUSD"),
-        ("Crypto.AVAX/USD", "AVAXUSD"),
-        ("Crypto.AXS/USD", "AXSUSD"),
-        ("Crypto.BAR/USD", "BARUSD"),
-        ("Crypto.BCH/USD", "BCHUSD"),
-        ("Crypto.BETH/USD", "BETHUSD"),
-        ("Crypto.BIT/USD", "BITUSD"),
-        ("Crypto.BNB/USD", "BNBUSD"),
-        ("Crypto.BNX/USD", "BNXUSD"),
-        ("Crypto.BONK/USD", "BONKUSD"),
-        ("Crypto.BTC/USD", "BTCUSD"),
-        ("Crypto.BUSD/USD", "BUSDUSD"),
-        ("Crypto.C98/USD", "C98USD"),
-        ("Crypto.CAKE/USD", "CAKEUSD"),
-        ("Crypto.CBETH/USD", "CBETHUSD"),
-        ("Crypto.CELO/USD", "CELOUSD"),
-        ("Crypto.CHR/USD", "CHRUSD"),
-        ("Crypto.CHZ/USD", "CHZUSD"),
-        ("Crypto.CITY/USD", "CITYUSD"),
-        ("Crypto.CRO/USD", "CROUSD"),
-        ("Crypto.CRV/USD", "CRVUSD"),
-        ("Crypto.CUSD/USD", "CUSDUSD"),
-        ("Crypto.CVX/USD", "CVXUSD"),
-        ("Crypto.DAI/USD", "DAIUSD"),
-        ("Crypto.DOGE/USD", "DOGEUSD"),
-        ("Crypto.DOT/USD", "DOTUSD"),
-        ("Crypto.DYDX/USD", "DYDXUSD"),
-        ("Crypto.ETH/USD", "ETHUSD"),
-        ("Crypto.FET/USD", "FETUSD"),
-        ("Crypto.FIDA/USD", "FIDAUSD"),
-        ("Crypto.FIL/USD", "FILUSD"),
-        ("Crypto.FLOKI/USD", "FLOKIUSD"),
-        ("Crypto.FLOW/USD", "FLOWUSD"),
-        ("Crypto.FTM/USD", "FTMUSD"),
-        ("Crypto.FTT/USD", "FTTUSD"),
-        ("Crypto.GAL/USD", "GALUSD"),
-        ("Crypto.GALA/USD", "GALAUSD"),
-        ("Crypto.GMT/USD", "GMTUSD"),
-        ("Crypto.GMX/USD", "GMXUSD"),
-        ("Crypto.INJ/USD", "INJUSD"),
-        ("Crypto.INTER/USD", "INTERUSD"),
-        ("Crypto.JST/USD", "JSTUSD"),
-        ("Crypto.JUV/USD", "JUVUSD"),
-        ("Crypto.LAZIO/USD", "LAZIOUSD"),
-        ("Crypto.LDO/USD", "LDOUSD"),
-        ("Crypto.LINK/USD", "LINKUSD"),
-        ("Crypto.LTC/USD", "LTCUSD"),
-        ("Crypto.LUNA/USD", "LUNAUSD"),
-        ("Crypto.LUNC/USD", "LUNCUSD"),
-        ("Crypto.MATIC/USD", "MATICUSD"),
-        ("Crypto.MBOX/USD", "MBOXUSD"),
-        ("Crypto.MIR/USD", "MIRUSD"),
-        ("Crypto.MNGO/USD", "MNGOUSD"),
-        ("Crypto.MSOL/USD", "MSOLUSD"),
-        ("Crypto.NEAR/USD", "NEARUSD"),
-        ("Crypto.OG/USD", "OGUSD"),
-        ("Crypto.ONE/USD", "ONEUSD"),
-        ("Crypto.OP/USD", "OPUSD"),
-        ("Crypto.ORCA/USD", "ORCAUSD"),
-        ("Crypto.PERP/USD", "PERPUSD"),
-        ("Crypto.PORT/USD", "PORTUSD"),
-        ("Crypto.PORTO/USD", "PORTOUSD"),
-        ("Crypto.PSG/USD", "PSGUSD"),
-        ("Crypto.RAY/USD", "RAYUSD"),
-        ("Crypto.SBR/USD", "SBRUSD"),
-        ("Crypto.SCNSOL/USD", "SCNSOLUSD"),
-        ("Crypto.SHIB/USD", "SHIBUSD"),
-        ("Crypto.SLND/USD", "SLNDUSD"),
-        ("Crypto.SNY/USD", "SNYUSD"),
-        ("Crypto.SOL/USD", "SOLUSD"),
-        ("Crypto.SRM/USD", "SRMUSD"),
-        ("Crypto.STSOL/USD", "STSOLUSD"),
-        ("Crypto.SWEAT/USD", "SWEATUSD"),
-        ("Crypto.THETA/USD", "THETAUSD"),
-        ("Crypto.TUSD/USD", "TUSDUSD"),
-        ("Crypto.UNI/USD", "UNIUSD"),
-        ("Crypto.USDC/USD", "USDCUSD"),
-        ("Crypto.USDT/USD", "USDTUSD"),
-        ("Crypto.USTC/USD", "USTCUSD"),
-        ("Crypto.WOO/USD", "WOOUSD"),
-        ("Crypto.XMR/USD", "XMRUSD"),
-        ("Crypto.XVS/USD", "XVSUSD"),
-        ("Crypto.ZBC/USD", "ZBCUSD"),
-        ("Crypto.XRP/USD", "XRPUSD"),
-        ("Crypto.TON/USD", "TONUSD"),
-        ("FX.AUD/USD", "AUDUSD"),
-        ("FX.EUR/USD", "EURUSD"),
-        ("FX.GBP/USD", "GBPUSD"),
-        ("FX.NZD/USD", "NZDUSD"),
-        ("FX.USD/CAD", "USDCAD"),
-        ("FX.USD/CHF", "USDCHF"),
-        ("FX.USD/CNH", "USDCNH"),
-        ("FX.USD/HKD", "USDHKD"),
-        ("FX.USD/JPY", "USDJPY"),
-        ("FX.USD/MXN", "USDMXN"),
-        ("FX.USD/SGD", "USDSGD"),
-        ("FX.USD/ZAR", "USDZAR"),
-        ("Metal.XAG/USD", "XAGUSD"),
-        ("Metal.XAU/USD", "XAUUSD"),
-    ]
-)
-
+# Calldata size of a keeper txn, keeps batches clear of the RPCs' body limits
+CALLDATA_MAX_BYTES_PER_TXN = {
+    "arb-sandbox": 120_000,
+    "blast-testnet": 120_000,
+    "arb-testnet": 120_000,
+    "arb-mainnet": 120_000,
+    "polygon-testnet": 120_000,
+    "polygon-mainnet": 120_000,
+}
 
+# Defined once in pyth, see asset_registry for lookups by asset
 SYMBOL_PYTH_MAPPING = {v: k for k, v in PYTH_SYMBOL_MAPPING.items()}
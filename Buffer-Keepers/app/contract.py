@@ -49,7 +49,7 @@ def write_txn(contract_instance, function_name, env, *args, value=0):
 
 
 def decode_txn(hash, environment):
-    logs = get_web3().eth.getTransactionReceipt(hash).logs
+    logs = get_web3(environment).eth.getTransactionReceipt(hash).logs
     contract_wise_events = dict(
         logs | groupby(lambda x: x["address"]) | select(lambda x: (x[0], list(x[1])))
     )
@@ -1,22 +1,33 @@
 import base64
 import json
 import logging
+import math
 import os
+import threading
 import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
 
 import config
 import contract
 import requests
-from cache import cache
+from accumulator import split_by_feed
+from asset_registry import asset_registry
+from batch import batch
+from cache import binary_cache, cache
 from eth_account import Account
 from eth_account.messages import encode_defunct
+from indexer import get_indexer
 from multicall import cached_multicall
 from pipe import chain, dedup, select, sort, where
-from pyth import FEED_ID_PYTH_SYMBOL_MAPPING
-from requests import Session
+from rate_limiter import get_rate_limiter
+from redis.exceptions import RedisError
+from requests.adapters import HTTPAdapter
 from retry import retry as retry_decorator
-from retry_requests import TSession, retry
+from retry_requests import TSession
 from timing import timing
+from urllib3.util.retry import Retry
+from vaa_store import vaa_store
 from web3 import Web3
 
 logger = logging.getLogger(__name__)
@@ -28,13 +39,147 @@ if os.getenv("DEBUG"):
 
 keeper_account = os.environ.get("KEEPER_ACCOUNT_PK")
 
-MAX_BATCH_SIZE = 100
+GRAPH_PAGE_SIZE = int(os.environ.get("GRAPH_PAGE_SIZE", 1000))
+
+VAA_FETCH_CONCURRENCY = int(os.environ.get("VAA_FETCH_CONCURRENCY", 16))
+# Deadline for a single VAA request and for a whole batch of them, in seconds
+VAA_FETCH_TIMEOUT = float(os.environ.get("VAA_FETCH_TIMEOUT", 2))
+VAA_BATCH_DEADLINE = float(os.environ.get("VAA_BATCH_DEADLINE", 5))
+VAA_FETCH_BACKOFF_FACTOR = 0.2
+VAA_CACHE_POLL_INTERVAL = 0.05
+# VAAs are cached for `maximumPriceDelayForResolving` seconds, but never less than this
+VAA_CACHE_MIN_TTL = 60
+
+
+def _fetch_budget(timeout, retries, backoff_factor):
+    """Longest a request can take with all its retries and their backoffs"""
+    return (retries + 1) * timeout + sum(
+        backoff_factor * 2**n for n in range(retries)
+    )
+
+
+def _retries_within(deadline, timeout, backoff_factor):
+    """
+    Most retries that fit in `deadline`, so that no request outlives the batch
+    it was made for. A cancelled future doesn't stop a request already running.
+    """
+    retries = 0
+    while _fetch_budget(timeout, retries + 1, backoff_factor) <= deadline:
+        retries += 1
+    return retries
+
+
+VAA_FETCH_RETRIES = _retries_within(
+    VAA_BATCH_DEADLINE, VAA_FETCH_TIMEOUT, VAA_FETCH_BACKOFF_FACTOR
+)
+# The fetch lock outlives the longest fetch, retries included
+VAA_LOCK_TTL = math.ceil(
+    _fetch_budget(VAA_FETCH_TIMEOUT, VAA_FETCH_RETRIES, VAA_FETCH_BACKOFF_FACTOR)
+)
+
+vaa_executor = ThreadPoolExecutor(
+    max_workers=VAA_FETCH_CONCURRENCY, thread_name_prefix="vaa"
+)
+# endpoint => settings of its session, retries are on top of the request itself
+HTTP_SESSION_CONFIG = {
+    "graph": {"timeout": 2, "retries": 2, "backoff_factor": 0.2, "pool_maxsize": 4},
+    "oracle": {"timeout": 5, "retries": 10, "backoff_factor": 0.1, "pool_maxsize": 4},
+    "hermes": {
+        "timeout": VAA_FETCH_TIMEOUT,
+        "retries": VAA_FETCH_RETRIES,
+        "backoff_factor": VAA_FETCH_BACKOFF_FACTOR,
+        "pool_maxsize": VAA_FETCH_CONCURRENCY,
+    },
+    # (connect, read) timeouts, Hermes sends an update every few hundred ms
+    "hermes_stream": {
+        "timeout": (5, 30),
+        "retries": 0,
+        "backoff_factor": 0,
+        "pool_maxsize": 1,
+    },
+}
+# endpoint => TSession
+HttpSessionMap = {}
+# (options contract, environment) => asset id
+AssetIdMap = {}
+_http_session_lock = threading.Lock()
+
+
+class RateLimitedSession(TSession):
+    """TSession taking a token from its endpoint's bucket for every request"""
+
+    def __init__(self, rate_limiter):
+        super().__init__()
+        self.rate_limiter = rate_limiter
+
+    def request(self, *args, **kwargs):
+        self.rate_limiter.acquire()
+        return super().request(*args, **kwargs)
+
+
+def _build_session(endpoint, timeout, retries, backoff_factor, pool_maxsize):
+    session = RateLimitedSession(get_rate_limiter(endpoint))
+    # Set after __init__, TSession only takes whole seconds
+    session.timeout = timeout
+    adapter = HTTPAdapter(
+        max_retries=Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(500, 502, 504),
+            # theGraph and the oracle are queried with POST
+            allowed_methods=None,
+        ),
+        pool_maxsize=pool_maxsize,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session(endpoint):
+    """
+    Returns the process-wide keep-alive session for `endpoint`, one of
+    HTTP_SESSION_CONFIG. It's built once so its connections are reused across
+    calls and keeper cycles.
+    """
+    session = HttpSessionMap.get(endpoint)
+    if session is None:
+        with _http_session_lock:
+            session = HttpSessionMap.get(endpoint)
+            if session is None:
+                session = _build_session(endpoint, **HTTP_SESSION_CONFIG[endpoint])
+                HttpSessionMap[endpoint] = session
+    return session
+
+
+def get_session_stats():
+    """
+    {endpoint: {requests, connections, reuse_rate}} since the start, where
+    `connections` is the number of connections opened to serve `requests`.
+    """
+    stats = {}
+    for endpoint, session in list(HttpSessionMap.items()):
+        pools = session.get_adapter("https://").poolmanager.pools
+        num_requests = num_connections = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                num_requests += pool.num_requests
+                num_connections += pool.num_connections
+        stats[endpoint] = {
+            "requests": num_requests,
+            "connections": num_connections,
+            "reuse_rate": round(1 - num_connections / num_requests, 3)
+            if num_requests
+            else None,
+        }
+    return stats
 
 
 @timing
 @retry_decorator(tries=2)
 def execute_graph_query(json_data, endpoint):
-    response = retry(TSession(timeout=2), retries=2, backoff_factor=0.2).post(
+    response = get_session("graph").post(
         endpoint,
         json=json_data,
     )
@@ -82,9 +227,7 @@ def fetch_prices(prices_to_fetch):
         @timing
         def f(uncached_prices_to_fetch):
             try:
-                r = retry(TSession(timeout=5), retries=10, backoff_factor=0.1).post(
-                    reqUrl, json=uncached_prices_to_fetch
-                )
+                r = get_session("oracle").post(reqUrl, json=uncached_prices_to_fetch)
                 try:
                     r.raise_for_status()
                 except Exception as e:
@@ -145,110 +288,535 @@ def get_asset_pair(option_contract_address, environment):
     return r
 
 
-@timing
-def get_option_to_execute(environment):
-    limit = 500
-    min_timestamp = int(time.time())
-
+def get_asset_id(option_contract_address, environment):
+    """
+    `asset_registry` id of the asset of an options contract, None when Pyth has
+    no feed for it. The pair of a contract never changes, so it's kept in memory.
+    """
+    key = (option_contract_address, environment)
+    if key not in AssetIdMap:
+        AssetIdMap[key] = asset_registry.get_id(
+            get_asset_pair(option_contract_address, environment)
+        )
+    return AssetIdMap[key]
+
+
+OPEN_OPTIONS_QUERY = """
+query UserOptionHistory {{
+    userOptionDatas(
+        orderBy: "creationTime"
+        orderDirection: "asc"
+        where: {{state_in: [1], queueID_not: null, creationTime_gte: "{cursor}"}}
+        first: {first}
+    ) {{
+        id
+        optionID
+        optionContract {{
+            address
+        }}
+        expirationTime
+        creationTime
+    }}
+}}"""
+
+# The options created at one creationTime, for when they don't fit in a page
+OPEN_OPTIONS_TIE_QUERY = """
+query UserOptionHistory {{
+    userOptionDatas(
+        orderBy: "id"
+        orderDirection: "asc"
+        where: {{state_in: [1], queueID_not: null, creationTime: "{cursor}", id_gt: "{last_id}"}}
+        first: {first}
+    ) {{
+        id
+        optionID
+        optionContract {{
+            address
+        }}
+        expirationTime
+        creationTime
+    }}
+}}"""
+
+QUEUED_OPTIONS_QUERY = """
+query MyQuery {{
+    queuedOptionDatas(
+        orderBy: "queueID"
+        orderDirection: "asc"
+        where: {{state_in: [4], queueID_gt: "{cursor}"}}
+        first: {first}
+    ) {{
+        queueID
+        state
+    }}
+}}"""
+
+
+def _graph_rows(query, operation_name, entity, endpoint):
     json_data = {
-        "query": f"""
-        query UserOptionHistory {{
-            userOptionDatas(
-                orderBy: "creationTime"
-                orderDirection: "asc"
-                where: {{state_in: [1], expirationTime_lt: "{str(int(time.time()))}", queueID_not: null}}
-                first: {limit}
-            ) {{
-                optionID
-                queueID
-                optionContract {{
-                    address
-                }}
-                expirationTime
-            }}
-        }}""",
+        "query": query,
         "variables": None,
-        "operationName": "UserOptionHistory",
+        "operationName": operation_name,
         "extensions": {
             "headers": None,
         },
     }
-    # Fetch from theGraph
-    expired_options = []
+    return execute_graph_query(json_data, endpoint)["data"][entity]
+
+
+def iter_graph_pages(
+    query, operation_name, entity, cursor_field, cursor, endpoint, tie_query=None
+):
+    """
+    Yields the `entity` rows in pages of GRAPH_PAGE_SIZE, each page starting
+    where the previous one ended. `query` is formatted with the cursor and the
+    page size and must be ordered by `cursor_field`.
+
+    When a whole page shares one `cursor_field` value, the rows with that value
+    are paged by id with `tie_query`, formatted with the cursor, the last id and
+    the page size, before moving past that value.
+    """
+    while True:
+        rows = _graph_rows(
+            query.format(cursor=cursor, first=GRAPH_PAGE_SIZE),
+            operation_name,
+            entity,
+            endpoint,
+        )
+        if rows:
+            yield rows
+        if len(rows) < GRAPH_PAGE_SIZE:
+            return
+        if rows[-1][cursor_field] != cursor:
+            cursor = rows[-1][cursor_field]
+            continue
+
+        if tie_query is None:
+            logger.warning(f"{entity}: page is full at {cursor_field}={cursor}")
+            return
+        last_id = ""
+        while True:
+            rows = _graph_rows(
+                tie_query.format(cursor=cursor, last_id=last_id, first=GRAPH_PAGE_SIZE),
+                operation_name,
+                entity,
+                endpoint,
+            )
+            if rows:
+                yield rows
+            if len(rows) < GRAPH_PAGE_SIZE:
+                break
+            last_id = rows[-1]["id"]
+        cursor = str(int(cursor) + 1)
+
+
+def _option_key(contract_address, option_id):
+    return f"{contract_address}:{option_id}"
+
+
+def sync_open_options(environment):
+    """
+    Adds the options created since the last high-water mark to the
+    `{environment}-open_options` sorted set, scored by expiration time.
+    """
+    open_options_key = f"{environment}-open_options"
+    cursor_key = f"{environment}-open_options_cursor"
+    for page in iter_graph_pages(
+        OPEN_OPTIONS_QUERY,
+        "UserOptionHistory",
+        "userOptionDatas",
+        "creationTime",
+        cache.get(cursor_key) or 0,
+        config.GRAPH_ENDPOINT[environment],
+        tie_query=OPEN_OPTIONS_TIE_QUERY,
+    ):
+        expirations = dict(
+            page
+            | select(
+                lambda x: (
+                    _option_key(
+                        Web3.toChecksumAddress(x["optionContract"]["address"]),
+                        int(x["optionID"]),
+                    ),
+                    int(x["expirationTime"]),
+                )
+            )
+        )
+        p = cache.pipeline()
+        p.zadd(open_options_key, expirations)
+        p.set(cursor_key, page[-1]["creationTime"])
+        p.execute()
+
+
+@timing
+def get_option_to_execute(environment):
+    indexer = get_indexer(environment)
+    if indexer:
+        return indexer.get_option_to_execute()
+
+    # Fetch the new options from theGraph
     try:
-        expired_options = execute_graph_query(
-            json_data, config.GRAPH_ENDPOINT[environment]
-        )["data"][
-            "userOptionDatas"
-        ]  # List[{optionID, contractAddress, expirationTime}]
+        sync_open_options(environment)
     except Exception as e:
         logger.exception(f"Error fetching from theGraph")
         time.sleep(5)
 
+    expired_options = cache.zrangebyscore(
+        f"{environment}-open_options", "-inf", f"({int(time.time())}", withscores=True
+    )
     expired_options = list(
-        list(expired_options)
+        expired_options
+        | select(lambda x: (x[0].split(":"), x[1]))
         | select(
             lambda x: {
-                **x,
-                "contractAddress": Web3.toChecksumAddress(
-                    x["optionContract"]["address"]
-                ),
-                "optionID": int(x["optionID"]),
-                "expirationTime": int(x["expirationTime"]),
+                "contractAddress": x[0][0],
+                "optionID": int(x[0][1]),
+                "expirationTime": int(x[1]),
             }
         )
-    )
+    )  # List[{optionID, contractAddress, expirationTime}]
 
     # logger.info(f"expired_options: {expired_options}")
     return expired_options
 
 
-@timing
-def get_option_to_open(environment):
-    limit = 1000
-    json_data = {
-        "query": f"""
-        query MyQuery {{
-            queuedOptionDatas(
-                orderBy: "queueID"
-                orderDirection: "asc"
-                where: {{state_in: [4], queueID_not: null}}
-                first: {limit}
-            ) {{
-                queueID
-                state
-            }}
-        }}""",
-        "variables": None,
-        "operationName": "MyQuery",
-        "extensions": {
-            "headers": None,
-        },
-    }
+def forget_option_to_execute(options, environment):
+    """Drops the options that aren't open anymore"""
+    if options:
+        cache.zrem(
+            f"{environment}-open_options",
+            *list(
+                options
+                | select(lambda x: _option_key(x["contractAddress"], x["optionID"]))
+            ),
+        )
+
+
+def iter_option_to_open(environment):
+    """
+    Yields the queued options in pages, the ones already known to be pending
+    first and then the ones queued since the last high-water mark.
+    """
+    indexer = get_indexer(environment)
+    if indexer:
+        yield indexer.get_option_to_open()
+        return
+
+    pending_key = f"{environment}-queued_options"
+    cursor_key = f"{environment}-queued_options_cursor"
+    pending = sorted(int(x) for x in cache.smembers(pending_key))
+    yield from (
+        pending | select(lambda x: {"queueID": x, "state": 4}) | batch(GRAPH_PAGE_SIZE)
+    )
 
-    queuedOptionDatas = []
     try:
-        response = execute_graph_query(
-            json_data,
+        for page in iter_graph_pages(
+            QUEUED_OPTIONS_QUERY,
+            "MyQuery",
+            "queuedOptionDatas",
+            "queueID",
+            cache.get(cursor_key) or -1,
             config.GRAPH_ENDPOINT[environment],
-        )
-        queuedOptionDatas = response["data"]["queuedOptionDatas"]
+        ):
+            p = cache.pipeline()
+            p.sadd(pending_key, *list(page | select(lambda x: x["queueID"])))
+            p.set(cursor_key, page[-1]["queueID"])
+            p.execute()
+            yield page
     except Exception as e:
         # logger.info(f"Error fetching from theGraph")
         pass
-    return queuedOptionDatas
 
 
-def get_vaa_for_a_specific_time(asset, timestamp, environment):
-    params = {"id": FEED_ID_PYTH_SYMBOL_MAPPING[asset], "publish_time": timestamp}
+@timing
+def get_option_to_open(environment):
+    return list(iter_option_to_open(environment) | chain)
+
+
+def forget_option_to_open(queue_ids, environment):
+    """Drops the queue ids that aren't queued anymore"""
+    if queue_ids:
+        cache.srem(f"{environment}-queued_options", *queue_ids)
+
+
+def _get_all_graph_rows(entity, where, fields, environment):
+    """Every `entity` row matching `where`, paged by id"""
+    rows = []
+    last_id = ""
+    while True:
+        json_data = {
+            "query": f"""
+            query AllRows {{
+                {entity}(
+                    orderBy: "id"
+                    orderDirection: "asc"
+                    where: {{{where}, id_gt: "{last_id}"}}
+                    first: 1000
+                ) {{
+                    id
+                    {fields}
+                }}
+            }}""",
+            "variables": None,
+            "operationName": "AllRows",
+            "extensions": {
+                "headers": None,
+            },
+        }
+        page = execute_graph_query(json_data, config.GRAPH_ENDPOINT[environment])[
+            "data"
+        ][entity]
+        rows += page
+        if len(page) < 1000:
+            return rows
+        last_id = page[-1]["id"]
+
+
+def get_indexer_seed(environment):
+    """
+    The queued trades and open options according to theGraph, for the indexer
+    to start from since it only replays its last blocks.
+    :return: ([queueId], {(contractAddress, optionId): expirationTime})
+    """
+    queue_ids = list(
+        _get_all_graph_rows(
+            "queuedOptionDatas",
+            "state_in: [4], queueID_not: null",
+            "queueID",
+            environment,
+        )
+        | select(lambda x: int(x["queueID"]))
+    )
+    open_options = dict(
+        _get_all_graph_rows(
+            "userOptionDatas",
+            "state_in: [1], queueID_not: null",
+            "optionID optionContract { address } expirationTime",
+            environment,
+        )
+        | select(
+            lambda x: (
+                (
+                    Web3.toChecksumAddress(x["optionContract"]["address"]),
+                    int(x["optionID"]),
+                ),
+                int(x["expirationTime"]),
+            )
+        )
+    )
+    return queue_ids, open_options
+
+
+def get_maximum_price_delay(environment):
+    cache_key = f"{environment}-maximum_price_delay"
+    r = cache.get(cache_key)
+    if r:
+        return int(r)
+    r = contract.ContractRegistryMap[environment][config.ROUTER[environment]].read(
+        "maximumPriceDelayForResolving"
+    )
+    cache.set(cache_key, r, ex=3600)
+    return int(r)
+
+
+def _vaa_cache_key(feed_id, publish_time):
+    return f"vaa:{feed_id}:{publish_time}"
+
+
+def _fetch_vaa(feed_id, publish_time):
+    params = {"id": feed_id, "publish_time": publish_time}
 
     endpoint = os.environ.get("PYTH_ENDPOINT", "") + "/api/get_vaa"
-    logger.info(f"endpoint: {endpoint}")
-    response = retry(TSession(timeout=2), retries=2, backoff_factor=0.2).get(
+    logger.debug(f"endpoint: {endpoint}")
+    response = get_session("hermes").get(endpoint, params=params)
+    response.raise_for_status()
+    return base64.b64decode(response.json()["vaa"])
+
+
+def _get_vaa_cache_ttl(environment):
+    """Falls back to VAA_CACHE_MIN_TTL so a VAA already fetched is never lost"""
+    try:
+        return max(get_maximum_price_delay(environment), VAA_CACHE_MIN_TTL)
+    except Exception as e:
+        logger.warning(f"Reading maximumPriceDelayForResolving: {e}")
+        return VAA_CACHE_MIN_TTL
+
+
+# Deletes the lock only if it still holds our token, it may have expired and
+# been taken by another keeper meanwhile
+_release_lock = binary_cache.register_script(
+    """
+    if redis.call("get", KEYS[1]) == ARGV[1] then
+        return redis.call("del", KEYS[1])
+    end
+    return 0
+    """
+)
+
+
+def _get_cached_vaa(feed_id, publish_time, environment):
+    """
+    Single-flight read-through cache: the keeper that takes the lock fetches the
+    VAA and stores it, the others wait for it to appear in the cache and only hit
+    Hermes themselves if it doesn't show up within VAA_FETCH_TIMEOUT.
+    """
+    cache_key = _vaa_cache_key(feed_id, publish_time)
+    vaa = binary_cache.get(cache_key)
+    if vaa is not None:
+        return vaa
+
+    lock_key = f"{cache_key}:lock"
+    token = uuid.uuid4().hex
+    locked = binary_cache.set(lock_key, token, nx=True, ex=VAA_LOCK_TTL)
+    if not locked:
+        deadline = time.time() + VAA_FETCH_TIMEOUT
+        while time.time() < deadline:
+            time.sleep(VAA_CACHE_POLL_INTERVAL)
+            vaa = binary_cache.get(cache_key)
+            if vaa is not None:
+                return vaa
+        logger.info(f"Gave up waiting for {cache_key}, fetching it")
+
+    try:
+        vaa = _fetch_vaa(feed_id, publish_time)
+        try:
+            binary_cache.set(cache_key, vaa, ex=_get_vaa_cache_ttl(environment))
+        except RedisError as e:
+            logger.warning(f"Error caching {cache_key}: {e}")
+    finally:
+        if locked:
+            _release_lock(keys=[lock_key], args=[token])
+    return vaa
+
+
+def get_vaa_for_a_specific_time(asset_id, timestamp, environment):
+    feed_id = asset_registry.feed_ids[asset_id]
+    vaa = vaa_store.get(asset_id, timestamp)
+    if vaa is not None:
+        return [vaa.hex()]
+    try:
+        vaa = _get_cached_vaa(feed_id, timestamp, environment)
+    except RedisError as e:
+        logger.warning(f"VAA cache unavailable, fetching directly: {e}")
+        vaa = _fetch_vaa(feed_id, timestamp)
+    return [vaa.hex()]
+
+
+def _fetch_vaas(feed_ids, publish_time):
+    """
+    Fetches the updates of several feeds at one publish time with a single
+    Hermes request.
+    :return: {feed_id: bytes}, one update blob per feed
+    """
+    endpoint = os.environ.get("PYTH_ENDPOINT", "") + f"/v2/updates/price/{publish_time}"
+    response = get_session("hermes").get(
         endpoint,
-        params=params,
+        params={"ids[]": feed_ids, "encoding": "hex", "parsed": "false"},
     )
-    return [base64.b64decode(response.json()["vaa"]).hex()]
+    response.raise_for_status()
+
+    updates = {}
+    for update_data in response.json()["binary"]["data"]:
+        updates.update(split_by_feed(update_data))
+    return updates
+
+
+def get_vaas_for_a_specific_time(asset_ids, timestamp, environment, deadline=None):
+    """
+    Update data for several assets at the same publish time. Cached feeds are
+    served from the VAA cache, the rest are fetched with one multi-id request and
+    any feed that request doesn't return is fetched on its own, unless
+    `deadline` has passed by then.
+    :return: {asset_id: price_update_data}
+    """
+    feed_ids = dict(asset_ids | select(lambda x: (asset_registry.feed_ids[x], x)))
+    if len(feed_ids) == 1:
+        asset_id = asset_ids[0]
+        return {asset_id: get_vaa_for_a_specific_time(asset_id, timestamp, environment)}
+
+    vaas = {}
+    try:
+        cached = binary_cache.mget(
+            list(feed_ids | select(lambda x: _vaa_cache_key(x, timestamp)))
+        )
+        vaas = dict(zip(feed_ids, cached) | where(lambda x: x[1] is not None))
+    except RedisError as e:
+        logger.warning(f"VAA cache unavailable, fetching directly: {e}")
+
+    uncached = list(feed_ids | where(lambda x: x not in vaas))
+    if uncached:
+        fetched = {}
+        try:
+            fetched = _fetch_vaas(uncached, timestamp)
+            fetched = dict(fetched.items() | where(lambda x: x[0] in feed_ids))
+            vaas.update(fetched)
+        except Exception as e:
+            logger.warning(f"Batch vaa fetch failing for {timestamp}: {e}")
+
+        try:
+            if fetched:
+                ttl = _get_vaa_cache_ttl(environment)
+                redis_pipeline = binary_cache.pipeline(transaction=False)
+                for feed_id, vaa in fetched.items():
+                    redis_pipeline.set(_vaa_cache_key(feed_id, timestamp), vaa, ex=ttl)
+                redis_pipeline.execute()
+        except Exception as e:
+            logger.warning(f"Error caching vaas for {timestamp}: {e}")
+
+    result = dict(vaas.items() | select(lambda x: (feed_ids[x[0]], [x[1].hex()])))
+    for feed_id, asset_id in feed_ids.items():
+        if feed_id not in vaas:
+            if deadline is not None and time.time() >= deadline:
+                logger.warning(f"No time left to fetch {feed_id} for {timestamp}")
+                continue
+            result[asset_id] = get_vaa_for_a_specific_time(
+                asset_id, timestamp, environment
+            )
+    return result
+
+
+@timing
+def get_vaas(asset_time_mapping, environment):
+    """
+    Fetches the VAAs for all the distinct (asset_id, timestamp) pairs, one request
+    per timestamp, concurrently. Timestamps that fail or miss VAA_BATCH_DEADLINE
+    are left out of the result so that one slow timestamp doesn't hold back the
+    rest of the batch. Updates the prefetcher already has in memory aren't
+    fetched at all.
+    :return: {(asset_id, timestamp): price_update_data}
+    """
+    vaas = {}
+    assets_by_time = {}
+    for asset_id, timestamp in set(asset_time_mapping):
+        vaa = vaa_store.get(asset_id, timestamp)
+        if vaa is not None:
+            vaas[(asset_id, timestamp)] = [vaa.hex()]
+        else:
+            assets_by_time.setdefault(timestamp, []).append(asset_id)
+    vaa_store.mark_active(set(asset_time_mapping | select(lambda x: x[0])))
+    if not assets_by_time:
+        return vaas
+
+    deadline = time.time() + VAA_BATCH_DEADLINE
+    futures = {
+        vaa_executor.submit(
+            get_vaas_for_a_specific_time, asset_ids, timestamp, environment, deadline
+        ): timestamp
+        for timestamp, asset_ids in assets_by_time.items()
+    }
+    done, not_done = wait(futures, timeout=VAA_BATCH_DEADLINE)
+
+    for future in done:
+        timestamp = futures[future]
+        try:
+            for asset_id, vaa in future.result().items():
+                vaas[(asset_id, timestamp)] = vaa
+        except Exception as e:
+            logger.warning(f"Error fetching vaas for {timestamp}: {e}")
+    for future in not_done:
+        future.cancel()
+        logger.warning(f"Fetching vaas for {futures[future]} missed the deadline")
+    return vaas
 
 
 if __name__ == "__main__":
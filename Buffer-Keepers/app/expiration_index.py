@@ -0,0 +1,79 @@
+"""
+Open options ordered by expiration time.
+
+Options are kept in a min-heap keyed by expiration, so the close keeper only
+touches the options that expired since its last round instead of re-reading
+the whole backlog. Expired options move to `expired` and stay there until
+they're removed (their Expire/Exercise event is seen), so an unlock that didn't
+go through is retried on the next round.
+"""
+import heapq
+import threading
+
+
+class ExpirationIndex:
+    def __init__(self):
+        self.heap = []  # [(expirationTime, option)]
+        self.expirations = {}  # option => expirationTime, not yet expired
+        self.expired = {}  # option => expirationTime
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.expirations) + len(self.expired)
+
+    def __contains__(self, option):
+        return option in self.expirations or option in self.expired
+
+    def add(self, option, expiration):
+        with self._lock:
+            if option in self.expired:
+                return
+            self.expirations[option] = expiration
+            heapq.heappush(self.heap, (expiration, option))
+
+    def update(self, expirations):
+        for option, expiration in expirations.items():
+            self.add(option, expiration)
+
+    def remove(self, option):
+        """Heap entries of removed options are dropped lazily when popped"""
+        with self._lock:
+            self.expirations.pop(option, None)
+            self.expired.pop(option, None)
+
+    def pop_expired(self, timestamp):
+        """Moves the options expiring before `timestamp` to `expired`, returns them"""
+        popped = []
+        with self._lock:
+            while self.heap and self.heap[0][0] < timestamp:
+                expiration, option = heapq.heappop(self.heap)
+                if self.expirations.get(option) != expiration:
+                    continue
+                del self.expirations[option]
+                self.expired[option] = expiration
+                popped.append((option, expiration))
+        return popped
+
+    def get_expired(self, timestamp):
+        """All the options expired before `timestamp` ordered by expiration"""
+        self.pop_expired(timestamp)
+        with self._lock:
+            return sorted(self.expired.items(), key=lambda x: x[1])
+
+    def get_upcoming(self, until):
+        """
+        Options expiring before `until` that haven't expired yet, ordered by
+        expiration. Only the part of the heap below `until` is visited.
+        """
+        upcoming = []
+        with self._lock:
+            stack = [0] if self.heap else []
+            while stack:
+                i = stack.pop()
+                expiration, option = self.heap[i]
+                if expiration >= until:
+                    continue
+                if self.expirations.get(option) == expiration:
+                    upcoming.append((option, expiration))
+                stack.extend(j for j in (2 * i + 1, 2 * i + 2) if j < len(self.heap))
+        return sorted(upcoming, key=lambda x: x[1])
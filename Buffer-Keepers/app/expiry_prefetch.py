@@ -0,0 +1,81 @@
+"""
+Fetches the VAAs of the options about to expire as soon as their expiration
+second is published, so the close keeper finds them in the VAA cache instead
+of fetching them while unlocking.
+"""
+import logging
+import os
+import threading
+import time
+
+from data_v2 import get_asset_id, get_vaas
+from pipe import select, where
+
+logger = logging.getLogger(__name__)
+
+# How far ahead the upcoming expirations are looked up, in seconds
+EXPIRY_PREFETCH_HORIZON = float(os.environ.get("EXPIRY_PREFETCH_HORIZON", 10))
+# Time for Hermes to serve the update of a second once it's over
+EXPIRY_PREFETCH_DELAY = float(os.environ.get("EXPIRY_PREFETCH_DELAY", 1))
+EXPIRY_PREFETCH_POLL_INTERVAL = 1
+# Expirations older than this are left to the close keeper
+EXPIRY_PREFETCH_MAX_AGE = 30
+
+
+class ExpiryPrefetcher:
+    def __init__(self, environment, expiration_index):
+        self.environment = environment
+        self.expiration_index = expiration_index
+        self.schedule = {}  # expirationTime => {asset id}
+        self.prefetched = set()  # expiration seconds already fetched
+        self.stopped = threading.Event()
+
+    def update_schedule(self, now):
+        """Adds the upcoming expirations to the schedule ahead of time"""
+        for (contract_address, _), expiration in self.expiration_index.get_upcoming(
+            now + EXPIRY_PREFETCH_HORIZON
+        ):
+            if expiration < now - EXPIRY_PREFETCH_MAX_AGE:
+                continue
+            if expiration in self.prefetched:
+                continue
+            asset_id = get_asset_id(contract_address, self.environment)
+            if asset_id is not None:
+                self.schedule.setdefault(expiration, set()).add(asset_id)
+
+    def prefetch(self, expiration):
+        assets = self.schedule.pop(expiration)
+        self.prefetched.add(expiration)
+        vaas = get_vaas(
+            list(assets | select(lambda x: (x, expiration))), self.environment
+        )
+        logger.info(f"Prefetched {len(vaas)}/{len(assets)} vaas for {expiration}")
+
+    def run(self):
+        while not self.stopped.is_set():
+            now = time.time()
+            next_wake_up = now + EXPIRY_PREFETCH_POLL_INTERVAL
+            try:
+                self.update_schedule(now)
+                for expiration in sorted(self.schedule):
+                    fetch_at = expiration + EXPIRY_PREFETCH_DELAY
+                    if fetch_at > time.time():
+                        next_wake_up = min(next_wake_up, fetch_at)
+                        break
+                    self.prefetch(expiration)
+                self.prefetched = set(
+                    self.prefetched
+                    | where(lambda x: x >= now - 2 * EXPIRY_PREFETCH_MAX_AGE)
+                )
+            except Exception as e:
+                logger.exception(e)
+            self.stopped.wait(max(next_wake_up - time.time(), 0))
+
+    def start(self):
+        threading.Thread(
+            target=self.run, name=f"expiry-prefetch-{self.environment}", daemon=True
+        ).start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
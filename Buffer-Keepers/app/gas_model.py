@@ -0,0 +1,165 @@
+"""
+Local gas limits and fee parameters for keeper txns.
+
+The gas used by `resolveQueuedTrades`/`unlockOptions` is close to linear in the
+number of items, so each (environment, function) keeps a ring buffer of recent
+(num_items, gas) samples from receipts and `estimate_gas` calls, fits
+`base + per_item * num_items` on them and predicts the limit for a batch size
+locally. `estimate_gas` is only called when there are too few or too old
+samples, or after a txn reverted.
+
+A receipt's `gasUsed` is what's left after refunds, which EIP-3529 caps at a
+fifth of the gas used before them, and the 63/64 rule holds back more for the
+subcalls, so receipts are sampled scaled by RECEIPT_GAS_HEADROOM.
+
+Samples are execution gas only. The calldata gas of a txn is known exactly from
+its bytes and varies with the updates its items carry, so it's taken out of the
+samples and added back to the prediction of every txn.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import config
+
+logger = logging.getLogger(__name__)
+
+GAS_MODEL_SAMPLES = int(os.environ.get("GAS_MODEL_SAMPLES", 20))
+GAS_MODEL_MIN_SAMPLES = int(os.environ.get("GAS_MODEL_MIN_SAMPLES", 3))
+# Seconds after which the newest sample is too old to predict from
+GAS_MODEL_MAX_AGE = int(os.environ.get("GAS_MODEL_MAX_AGE", 600))
+GAS_LIMIT_MARGIN = float(os.environ.get("GAS_LIMIT_MARGIN", 1.25))
+# Execution gas needed for a receipt's `gasUsed`: refunds give back up to 1/5
+# of the gas used before them, subcalls only get 63/64 of what's left
+RECEIPT_GAS_HEADROOM = 1 / (1 - 1 / 5) * 64 / 63
+FEE_PARAMS_TTL = int(os.environ.get("FEE_PARAMS_TTL", 15))
+# Used for batch sizing until the model has seen a txn
+DEFAULT_GAS_PER_ITEM = int(os.environ.get("DEFAULT_GAS_PER_ITEM", 300_000))
+
+# (environment, function_name) => GasModel
+GasModelMap = {}
+# environment => (fetched_at, fee params)
+FeeParamsMap = {}
+# txn_hash => (GasModel, num_items, data_gas) for the txns sent but not mined yet
+PendingGasMap = {}
+_gas_model_lock = threading.Lock()
+
+
+class GasModel:
+    def __init__(self, environment, function_name):
+        self.environment = environment
+        self.function_name = function_name
+        self.samples = deque(maxlen=GAS_MODEL_SAMPLES)
+        self._lock = threading.Lock()
+
+    def record(self, num_items, gas):
+        with self._lock:
+            self.samples.append((num_items, gas, time.time()))
+
+    def invalidate(self):
+        with self._lock:
+            self.samples.clear()
+
+    def fit(self):
+        """:return: (base, per_item) least squares fit of the samples"""
+        with self._lock:
+            samples = list(self.samples)
+        n = len(samples)
+        mean_items = sum(x[0] for x in samples) / n
+        mean_gas = sum(x[1] for x in samples) / n
+        variance = sum((x[0] - mean_items) ** 2 for x in samples)
+        if variance == 0:
+            return 0, mean_gas / mean_items
+        per_item = (
+            sum((x[0] - mean_items) * (x[1] - mean_gas) for x in samples) / variance
+        )
+        return max(mean_gas - per_item * mean_items, 0), max(per_item, 0)
+
+    def is_stale(self):
+        with self._lock:
+            return (
+                len(self.samples) < GAS_MODEL_MIN_SAMPLES
+                or time.time() - self.samples[-1][2] > GAS_MODEL_MAX_AGE
+            )
+
+    def predict(self, num_items, data_gas=0):
+        """
+        :param data_gas: calldata gas of the txn
+        :return: Gas limit for `num_items` items, None if the model is stale
+        """
+        if self.is_stale():
+            return None
+        base, per_item = self.fit()
+        return int((base + per_item * num_items + data_gas) * GAS_LIMIT_MARGIN)
+
+
+def get_gas_model(environment, function_name):
+    key = (environment, function_name)
+    with _gas_model_lock:
+        if key not in GasModelMap:
+            GasModelMap[key] = GasModel(environment, function_name)
+        return GasModelMap[key]
+
+
+def get_gas_params(environment, function_name):
+    """:return: (base, per_item) execution gas of `function_name`, for sizing batches"""
+    gas_model = get_gas_model(environment, function_name)
+    base, per_item = gas_model.fit() if gas_model.samples else (0, 0)
+    return base, per_item or DEFAULT_GAS_PER_ITEM
+
+
+def get_max_batch_gas(environment):
+    """Gas a batch can be estimated at so that its limit fits GAS_LIMIT_PER_TXN"""
+    return config.GAS_LIMIT_PER_TXN[environment] / GAS_LIMIT_MARGIN
+
+
+def get_batch_size(environment, function_name):
+    """Most items of `function_name` that fit in one txn under GAS_LIMIT_PER_TXN"""
+    base, per_item = get_gas_params(environment, function_name)
+    gas_limit = get_max_batch_gas(environment)
+    return max(int((gas_limit - base) // per_item), 1)
+
+
+def get_fee_params(environment, web3):
+    """
+    EIP-1559 fee fields (or `gasPrice` on chains without a base fee), refreshed at
+    most every FEE_PARAMS_TTL seconds instead of on every send.
+    """
+    fetched_at, fee_params = FeeParamsMap.get(environment, (0, None))
+    if time.time() - fetched_at < FEE_PARAMS_TTL:
+        return fee_params
+
+    base_fee = web3.eth.get_block("latest").get("baseFeePerGas")
+    if base_fee is None:
+        fee_params = {"gasPrice": web3.eth.gas_price}
+    else:
+        priority_fee = web3.eth.max_priority_fee
+        fee_params = {
+            "maxFeePerGas": 2 * base_fee + priority_fee,
+            "maxPriorityFeePerGas": priority_fee,
+        }
+    FeeParamsMap[environment] = (time.time(), fee_params)
+    return fee_params
+
+
+def txn_sent(txn_hash, gas_model, num_items, data_gas=0):
+    PendingGasMap[txn_hash] = (gas_model, num_items, data_gas)
+
+
+def txn_mined(txn_hash, receipt):
+    """Learns from the receipt, a reverted txn makes the model re-estimate"""
+    gas_model, num_items, data_gas = PendingGasMap.pop(txn_hash, (None, None, 0))
+    if gas_model is None:
+        return
+    if receipt["status"] == 0:
+        logger.info(
+            f"{gas_model.function_name} reverted on {gas_model.environment}, "
+            "re-estimating gas for the next txn"
+        )
+        gas_model.invalidate()
+    else:
+        gas_model.record(
+            num_items, (receipt["gasUsed"] - data_gas) * RECEIPT_GAS_HEADROOM
+        )
@@ -2,25 +2,32 @@ import json
 import logging
 import os
 import time
+from collections import Counter, deque
 
 import config
 import contract
 import requests
+from asset_registry import asset_registry
 from cache import cache
+from calldata import CalldataBuilder
 from config import ROUTER, ZERO_ADDRESS
 from data_v2 import (
     fetch_prices,
-    get_asset_pair,
+    forget_option_to_execute,
+    forget_option_to_open,
+    get_asset_id,
     get_option_to_execute,
-    get_option_to_open,
-    get_vaa_for_a_specific_time,
+    get_vaas,
+    iter_option_to_open,
 )
 from eth_account import Account
 from eth_account.messages import encode_defunct
+from gas_model import get_gas_params, get_max_batch_gas
 from multicall import cached_multicall
+from nonce_manager import MAX_OUTSTANDING_TXNS
 from pipe import chain, dedup, select, sort, where
-from pyth import FEED_ID_PYTH_SYMBOL_MAPPING
 from timing import timing
+from update_fee import get_update_fee
 from utility import get_account
 
 logger = logging.getLogger(__name__)
@@ -28,7 +35,6 @@ logging.basicConfig(level=logging.INFO)
 
 
 keeper_account = os.environ["KEEPER_ACCOUNT_PK"]
-MAX_BATCH_SIZE = 100
 pyth_abi = "./abis/Pyth.json"
 
 from pipe import Pipe
@@ -39,22 +45,22 @@ def _(x):
 
 
 def get_target_contract_mapping(d, environment):
-    # Filter out the ones for invalid pairs
-    target_option_contracts_mapping = list(
+    """:return: {options contract: asset id}"""
+    target_option_contracts_mapping = dict(
         d
         | select(lambda x: x["contractAddress"])
         | dedup
         | select(
             lambda options_contract: (
                 options_contract,
-                get_asset_pair(options_contract, environment),
+                get_asset_id(options_contract, environment),
             )
         )
     )
 
+    # Filter out the ones for invalid pairs
     target_option_contracts_mapping = dict(
-        target_option_contracts_mapping
-        | select(lambda x: (x[0], x[1].replace("-", "")))
+        target_option_contracts_mapping.items() | where(lambda x: x[1] is not None)
     )
     logger.info(f"target_option_contracts_mapping: {(target_option_contracts_mapping)}")
 
@@ -71,89 +77,155 @@ def is_strike_valid(slippage, current_price, strike):
 
 
 def get_price_data(asset_time_mapping, environment):
-    price_update_data = dict(
-        asset_time_mapping
-        | select(
-            lambda x: (
-                f"{x[0]}-{x[1]}",
-                get_vaa_for_a_specific_time(x[0], int(x[1]), environment),
-            )
+    """
+    Fetches the update data for every (asset_id, timestamp) pair. Pairs whose VAA
+    couldn't be fetched in time are missing from the result, the caller is
+    expected to skip them for this round.
+    :return: {(asset_id, timestamp): price_update_data}
+    """
+    return get_vaas(asset_time_mapping, environment)
+
+
+def get_payload_fee(payload, environment):
+    """
+    priceUpdateData is the second last field of both the resolve and unlock
+    items. The Router pays for the update of every item, so the fee of each
+    distinct update is looked up once and counted for every item carrying it.
+    """
+    updates = Counter(payload | select(lambda x: tuple(x[-2])))
+    return sum(
+        get_update_fee(list(update), environment) * count
+        for update, count in updates.items()
+    )
+
+
+def build_batches(payload, function_name, environment):
+    """
+    Encodes the items into txns one after the other, starting a new txn when the
+    next item would take the current one over CALLDATA_MAX_BYTES_PER_TXN or over
+    GAS_LIMIT_PER_TXN.
+    """
+    base_gas, item_gas = get_gas_params(environment, function_name)
+
+    def new_batch():
+        return CalldataBuilder(
+            function_name,
+            max_bytes=config.CALLDATA_MAX_BYTES_PER_TXN[environment],
+            max_gas=get_max_batch_gas(environment),
+            base_gas=base_gas,
+            item_gas=item_gas,
         )
-    )  # List[(assetPair, timestamp)]
-    pyth_contract = contract.ContractRegistryMap[environment][config.PYTH[environment]]
 
-    total_fee = sum(
-        list(
-            asset_time_mapping
-            | select(
-                lambda x: pyth_contract.read(
-                    "getUpdateFee", price_update_data[f"{x[0]}-{x[1]}"]
+    batches = []
+    builder = new_batch()
+    for item in payload:
+        if not builder.add(item):
+            batches.append(builder)
+            builder = new_batch()
+            builder.add(item)
+    if builder.items:
+        batches.append(builder)
+    return batches
+
+
+def submit_batches(function_name, payload, environment):
+    """
+    Sends one txn per batch of `payload` without waiting for the previous ones to
+    be mined, keeping at most MAX_OUTSTANDING_TXNS of them unconfirmed.
+    """
+    router_contract = contract.ContractRegistryMap[environment][ROUTER[environment]]
+    pending_txns = deque()
+
+    def confirm(txn_hash):
+        try:
+            router_contract.wait_for_txn(txn_hash)
+            events = contract.decode_txn(txn_hash, environment)
+            logger.info(f"events: {(events)}")
+        except Exception as e:
+            logger.exception(e)
+
+    batches = build_batches(payload, function_name, environment)
+    logger.info(f"{function_name}: {len(payload)} items in {len(batches)} txns")
+    for builder in batches:
+        if len(pending_txns) >= MAX_OUTSTANDING_TXNS:
+            confirm(pending_txns.popleft())
+        try:
+            logger.info(
+                f"{function_name} payload: {(builder.items)}, "
+                f"{builder.num_bytes} bytes, ~{int(builder.gas)} gas"
+            )
+            pending_txns.append(
+                router_contract.write_calldata(
+                    function_name,
+                    builder.build(),
+                    len(builder),
+                    value=get_payload_fee(builder.items, environment),
+                    wait=False,
                 )
             )
+        except Exception as e:
+            if "nonce too low" in str(e):
+                logger.info(e)
+            else:
+                logger.exception(e)
+
+    while pending_txns:
+        confirm(pending_txns.popleft())
+
+
+def iter_queue_ids(environment):
+    """Yields the queue ids to resolve page by page, as theGraph returns them"""
+    for page in iter_option_to_open(environment):
+        queue_ids = list(
+            page
+            | where(lambda x: x["state"] == 4)
+            | select(lambda x: int(x["queueID"]))
+            | dedup
+            | sort(key=lambda x: x)
         )
-        # list(
-        #     cached_multicall(
-        #         list(
-        #             asset_time_mapping
-        #             | select(
-        #                 lambda x: (
-        #                     config.PYTH[environment],
-        #                     pyth_abi,
-        #                     "getUpdateFee",
-        #                     price_update_data[f"{x[0]}-{x[1]}"],
-        #                 )
-        #             )
-        #         ),
-        #         environment=environment,
-        #     )
-        # )
-    )
-    return price_update_data, total_fee
 
+        if queue_ids:
+            logger.debug(f"Queue ids from theGraph: {_(queue_ids)}")
+            yield queue_ids
 
-@timing
-def open(environment):
-    router_abi = "./abis/Router.json"
-    queue_ids = list(
-        get_option_to_open(environment)
-        | where(lambda x: x["state"] == 4)
-        | select(lambda x: int(x["queueID"]))
-        | dedup
-        | sort(key=lambda x: x)
-    )
 
-    if queue_ids:
-        logger.debug(f"Queue ids from theGraph: {_(queue_ids)}")
+def get_queue_ids(environment):
+    return list(iter_queue_ids(environment) | chain)
 
-    unresolved_trades = []
-    router_contract = contract.ContractRegistryMap[environment][ROUTER[environment]]
 
-    queue_ids = queue_ids[:MAX_BATCH_SIZE]
-    unresolved_trades = list(
-        list(
-            zip(
-                queue_ids,
+def get_unresolved_trades(queue_ids, environment):
+    router_abi = "./abis/Router.json"
+    queued_trades = list(
+        zip(
+            queue_ids,
+            cached_multicall(
                 list(
                     queue_ids
-                    | select(lambda x: router_contract.read("queuedTrades", x))
+                    | select(
+                        lambda x: (
+                            ROUTER[environment],
+                            router_abi,
+                            "queuedTrades",
+                            x,
+                        )
+                    )
                 ),
-                # cached_multicall(
-                #     list(
-                #         queue_ids
-                #         | select(
-                #             lambda x: (
-                #                 ROUTER[environment],
-                #                 router_abi,
-                #                 "queuedTrades",
-                #                 x,
-                #             )
-                #         )
-                #     ),
-                #     environment=environment,
-                # ),
-            )
+                environment=environment,
+            ),
         )
-        | where(lambda x: x[1][10])
+    )
+    forget_option_to_open(
+        list(
+            queued_trades
+            | where(lambda x: x[1] and not x[1][10])
+            | select(lambda x: x[0])
+        ),
+        environment,
+    )
+
+    unresolved_trades = list(
+        queued_trades
+        | where(lambda x: x[1] and x[1][10])
         | select(
             lambda x: {
                 "queueId": x[0],
@@ -164,57 +236,72 @@ def open(environment):
         )
     )
 
-    if not unresolved_trades:
-        return
+    if unresolved_trades:
+        logger.info(f"unresolved_trades: {_(unresolved_trades)}")
+    return unresolved_trades
 
-    logger.info(f"unresolved_trades: {_(unresolved_trades)}")
 
+def get_resolve_payload(unresolved_trades, environment):
     target_option_contracts_mapping = get_target_contract_mapping(
         unresolved_trades, environment
     )
 
-    _asset = lambda x: target_option_contracts_mapping[x["contractAddress"]]
-    asset_time_mapping = list(
+    unresolved_trades = list(
         unresolved_trades
-        | select(
-            lambda x: f"{target_option_contracts_mapping[x['contractAddress']]}%{x['queueTimestamp']}",
-        )
-        | select(lambda x: x.split("%"))
+        | where(lambda x: x["contractAddress"] in target_option_contracts_mapping)
     )
+    _key = lambda x: (
+        target_option_contracts_mapping[x["contractAddress"]],
+        int(x["queueTimestamp"]),
+    )
+    asset_time_mapping = list(unresolved_trades | select(_key))
     logger.info(f"asset_time_mapping: {(asset_time_mapping)}")
 
-    price_update_data, total_fee = get_price_data(asset_time_mapping, environment)
+    price_update_data = get_price_data(asset_time_mapping, environment)
 
-    unresolved_trades = list(
+    resolve_payload = list(
         unresolved_trades
+        | where(lambda x: _key(x) in price_update_data)
         | select(
             lambda x: (
                 int(x["queueId"]),  # queueId
-                price_update_data[f"{_asset(x)}-{x['queueTimestamp']}"],
-                [FEED_ID_PYTH_SYMBOL_MAPPING[_asset(x)]],
+                price_update_data[_key(x)],
+                [asset_registry.feed_id_bytes[_key(x)[0]]],
             )
         )
         | dedup(key=lambda x: x[0])
     )  # List[(queueId, timestamp, price, signature)]
+    return resolve_payload
 
-    if unresolved_trades:
-        logger.info(f"resolve payload: {(unresolved_trades)}")
 
-        try:
-            events = contract.write_txn(
-                router_contract,
-                "resolveQueuedTrades",
-                environment,
-                unresolved_trades,
-                value=total_fee,
-            )
+def send_resolve_queued_trades(builder, total_fee, environment):
+    """
+    Sends the resolveQueuedTrades txn of a batch from `build_batches` without
+    waiting for it to be mined
+    """
+    logger.info(
+        f"resolve payload: {(builder.items)}, "
+        f"{builder.num_bytes} bytes, ~{int(builder.gas)} gas"
+    )
+    router_contract = contract.ContractRegistryMap[environment][ROUTER[environment]]
+    return router_contract.write_calldata(
+        "resolveQueuedTrades",
+        builder.build(),
+        len(builder),
+        value=total_fee,
+        wait=False,
+    )
 
-            logger.info(f"events: {(events)}")
-        except Exception as e:
-            if "nonce too low" in str(e):
-                logger.info(e)
-            else:
-                logger.exception(e)
+
+@timing
+def open(environment):
+    queue_ids = get_queue_ids(environment)
+    unresolved_trades = get_unresolved_trades(queue_ids, environment)
+    if not unresolved_trades:
+        return
+
+    resolve_payload = get_resolve_payload(unresolved_trades, environment)
+    submit_batches("resolveQueuedTrades", resolve_payload, environment)
 
 
 def unlock_options(environment):
@@ -225,60 +312,37 @@ def unlock_options(environment):
 
     logger.debug(f"expired_options from theGraph: {_(expired_options)}")
 
-    # Filter out the ones for invalid pairs
-    target_option_contracts_mapping = list(
-        expired_options
-        | select(lambda x: x["contractAddress"])
-        | dedup
-        | select(
-            lambda options_contract: (
-                options_contract,
-                get_asset_pair(options_contract, environment),
-            )
-        )
-    )
-
-    target_option_contracts_mapping = dict(
-        target_option_contracts_mapping
-        | select(lambda x: (x[0], x[1].replace("-", "")))
-    )
-
-    # Take the initial 100
-    expired_options = expired_options[:MAX_BATCH_SIZE]
-
     expired_options = list(
-        list(
-            zip(
-                expired_options,
+        zip(
+            expired_options,
+            cached_multicall(
                 list(
                     expired_options
                     | select(
-                        lambda x: contract.get_contract_instance(
-                            contract_address=contract.get_checksum_address(
-                                x["contractAddress"]
-                            ),
-                            environment=environment,
-                            abi_path="./abis/BufferOptions.json",
-                        ).read("options", x["optionID"])
+                        lambda x: (
+                            x["contractAddress"],
+                            options_abi,
+                            "options",
+                            x["optionID"],
+                        )
                     )
                 ),
-                # cached_multicall(
-                #     list(
-                #         expired_options
-                #         | select(
-                #             lambda x: (
-                #                 x["contractAddress"],
-                #                 options_abi,
-                #                 "options",
-                #                 x["optionID"],
-                #             )
-                #         )
-                #     ),
-                #     environment=environment,
-                # ),
-            )
+                environment=environment,
+            ),
         )
-        | where(lambda x: x[1][0] == 1)
+    )
+    forget_option_to_execute(
+        list(
+            expired_options
+            | where(lambda x: x[1] and x[1][0] != 1)
+            | select(lambda x: x[0])
+        ),
+        environment,
+    )
+
+    expired_options = list(
+        expired_options
+        | where(lambda x: x[1] and x[1][0] == 1)
         | select(lambda x: x[0])
     )
 
@@ -290,48 +354,33 @@ def unlock_options(environment):
     target_option_contracts_mapping = get_target_contract_mapping(
         expired_options, environment
     )
-    asset_time_mapping = list(
+    expired_options = list(
         expired_options
-        | select(
-            lambda x: f"{target_option_contracts_mapping[x['contractAddress']]}%{x['expirationTime']}",
-        )
-        | select(lambda x: x.split("%"))
+        | where(lambda x: x["contractAddress"] in target_option_contracts_mapping)
+    )
+    _key = lambda x: (
+        target_option_contracts_mapping[x["contractAddress"]],
+        int(x["expirationTime"]),
     )
+    asset_time_mapping = list(expired_options | select(_key))
 
-    price_update_data, total_fee = get_price_data(asset_time_mapping, environment)
-    _asset = lambda x: target_option_contracts_mapping[x["contractAddress"]]
+    price_update_data = get_price_data(asset_time_mapping, environment)
 
     unlock_payload = list(
         expired_options
+        | where(lambda x: _key(x) in price_update_data)
         | select(
             lambda x: (
                 x["optionID"],
                 x["contractAddress"],
-                price_update_data[f'{_asset(x)}-{x["expirationTime"]}'],
-                [FEED_ID_PYTH_SYMBOL_MAPPING[_asset(x)]],
+                price_update_data[_key(x)],
+                [asset_registry.feed_id_bytes[_key(x)[0]]],
             )
         )
-        | dedup(key=lambda x: f"{x[0]}-{x[1]}")
+        | dedup(key=lambda x: (x[0], x[1]))
     )
 
-    if unlock_payload:
-        logger.info(f"unlock_payload: {(unlock_payload)}")
-        router_contract = contract.ContractRegistryMap[environment][ROUTER[environment]]
-
-        try:
-            events = contract.write_txn(
-                router_contract,
-                "unlockOptions",
-                environment,
-                unlock_payload,
-                value=total_fee,
-            )
-            logger.info(f"events: {(events)}")
-        except Exception as e:
-            if "nonce too low" in str(e):
-                logger.info(e)
-            else:
-                logger.exception(e)
+    submit_batches("unlockOptions", unlock_payload, environment)
 
 
 def register_all_contracts(environment):
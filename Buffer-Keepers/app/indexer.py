@@ -0,0 +1,302 @@
+"""
+Follows the Router and BufferOptions logs through `eth_getLogs` and keeps the
+queued trades and open options locally, so that the keepers can find work one
+block after it's created instead of waiting for theGraph to index it.
+
+Every Router and options event the keepers care about is fetched with a single
+`eth_getLogs` per block range, filtered by topic0 only. Options logs are only
+applied for contracts registered on the Router. The block range grows while the
+node answers and is halved whenever it refuses the range or times out.
+
+Only the last INDEXER_LOOKBACK_BLOCKS are replayed unless INDEXER_START_BLOCK is
+set, so the indexer is first seeded with the queued trades and open options
+theGraph knows about, the logs replayed after that close the ones that aren't
+open anymore. The index is only served while its last successful sync is
+recent, the keepers go back to theGraph otherwise.
+"""
+import logging
+import os
+import threading
+import time
+
+import requests
+from config import ROUTER
+from expiration_index import ExpirationIndex
+from multicall import cached_multicall
+from pipe import select, where
+from services.event_service import get_event_table, to_topic
+from utility import get_web3
+from web3 import Web3
+
+logger = logging.getLogger(__name__)
+
+ROUTER_ABI = "./abis/Router.json"
+OPTIONS_ABI = "./abis/BufferOptions.json"
+ROUTER_EVENTS = ("InitiateTrade", "OpenTrade", "CancelTrade", "RegisterContract")
+OPTIONS_EVENTS = ("Create", "Expire", "Exercise")
+
+INDEXER_POLL_INTERVAL = float(os.environ.get("INDEXER_POLL_INTERVAL", 0.5))
+# Blocks scanned on startup when INDEXER_START_BLOCK isn't set
+INDEXER_LOOKBACK_BLOCKS = int(os.environ.get("INDEXER_LOOKBACK_BLOCKS", 200_000))
+INDEXER_CONFIRMATIONS = int(os.environ.get("INDEXER_CONFIRMATIONS", 0))
+INDEXER_MIN_RANGE = 1
+INDEXER_MAX_RANGE = int(os.environ.get("INDEXER_MAX_RANGE", 50_000))
+# The range stops growing once a single response carries this many logs
+INDEXER_TARGET_LOGS = 2000
+# The index is served once it's at most this many blocks behind the chain
+INDEXER_MAX_LAG = 5
+# ...and its last successful sync is at most this many seconds old
+INDEXER_MAX_STALENESS = float(os.environ.get("INDEXER_MAX_STALENESS", 30))
+
+# environment => EventIndexer
+IndexerMap = {}
+
+
+class EventIndexer:
+    def __init__(self, environment, start_block=None, seed=None):
+        """
+        :param seed: called with the environment before the first block is
+            indexed, returns the queued trades and open options to start from as
+            ([queueId], {(contractAddress, optionId): expirationTime})
+        """
+        self.environment = environment
+        self.seed = seed
+        self.router = ROUTER[environment]
+        self.web3 = get_web3(environment)
+        router_table = get_event_table(ROUTER_ABI)
+        options_table = get_event_table(OPTIONS_ABI)
+        self.router_decoders = dict(
+            router_table.items() | where(lambda x: x[1].name in ROUTER_EVENTS)
+        )
+        self.options_decoders = dict(
+            options_table.items() | where(lambda x: x[1].name in OPTIONS_EVENTS)
+        )
+        self.topics = [
+            Web3.toHex(topic)
+            for topic in [*self.router_decoders, *self.options_decoders]
+        ]
+
+        self.next_block = start_block
+        self.head = None
+        self.synced_at = None  # time of the last successful sync
+        self.block_range = INDEXER_MAX_RANGE
+        self.queued_trades = {}  # queueId => queuedTime
+        # (contractAddress, optionId) ordered by expirationTime
+        self.open_options = ExpirationIndex()
+        self.registered_contracts = {}  # options contract => isRegistered
+        self._lock = threading.Lock()
+        self.stopped = threading.Event()
+        # Called with the names of the events applied in a round
+        self.listeners = []
+
+    @property
+    def is_synced(self):
+        return (
+            self.head is not None
+            and self.next_block is not None
+            and self.head - self.next_block + 1 <= INDEXER_MAX_LAG
+            and self.synced_at is not None
+            and time.time() - self.synced_at <= INDEXER_MAX_STALENESS
+        )
+
+    def _get_logs(self, from_block, to_block):
+        return self.web3.eth.get_logs(
+            {
+                "fromBlock": from_block,
+                "toBlock": to_block,
+                "topics": [self.topics],
+            }
+        )
+
+    def _fetch_range(self, from_block, latest_block):
+        """
+        Fetches the logs of the largest range the node accepts starting at
+        `from_block`, returns (to_block, logs).
+        """
+        while True:
+            to_block = min(from_block + self.block_range - 1, latest_block)
+            try:
+                logs = self._get_logs(from_block, to_block)
+            except (ValueError, requests.exceptions.RequestException) as e:
+                # Too many results, range too large or the node timed out
+                if self.block_range <= INDEXER_MIN_RANGE:
+                    raise
+                self.block_range = max(self.block_range // 2, INDEXER_MIN_RANGE)
+                logger.info(f"eth_getLogs failed, range -> {self.block_range}: {e}")
+                continue
+
+            if len(logs) < INDEXER_TARGET_LOGS // 2:
+                self.block_range = min(self.block_range * 2, INDEXER_MAX_RANGE)
+            return to_block, logs
+
+    def _is_registered(self, contract_addresses):
+        unknown = list(
+            contract_addresses | where(lambda x: x not in self.registered_contracts)
+        )
+        if unknown:
+            results = cached_multicall(
+                list(
+                    unknown
+                    | select(lambda x: (self.router, ROUTER_ABI, "contractRegistry", x))
+                ),
+                environment=self.environment,
+            )
+            for contract_address, is_registered in zip(unknown, results):
+                self.registered_contracts[contract_address] = bool(is_registered)
+        return self.registered_contracts
+
+    def _get_expirations(self, options):
+        results = cached_multicall(
+            list(options | select(lambda x: (x[0], OPTIONS_ABI, "options", x[1]))),
+            environment=self.environment,
+        )
+        return dict(
+            zip(options, results)
+            | where(lambda x: x[1] and x[1][0] == 1)
+            | select(lambda x: (x[0], x[1][5]))
+        )
+
+    def apply(self, logs):
+        router_logs, options_logs = [], []
+        for log in logs:
+            if not log["topics"]:
+                continue
+            topic = to_topic(log["topics"][0])
+            if log["address"] == self.router and topic in self.router_decoders:
+                router_logs.append(self.router_decoders[topic].decode(log))
+            elif topic in self.options_decoders:
+                options_logs.append((self.options_decoders[topic], log))
+
+        for event in router_logs:
+            if event["event_name"] == "RegisterContract":
+                args = event["args"]
+                registered = args["isRegistered"]
+                self.registered_contracts[args["targetContract"]] = registered
+
+        # Other contracts may emit events with the same signature
+        registered_contracts = self._is_registered(
+            set(options_logs | select(lambda x: x[1]["address"]))
+        )
+        options_logs = list(
+            options_logs
+            | where(lambda x: registered_contracts[x[1]["address"]])
+            | select(lambda x: x[0].decode(x[1]))
+        )
+
+        created_options = []
+        with self._lock:
+            for event in sorted(
+                router_logs + options_logs,
+                key=lambda x: (x["blockNumber"], x["log_index"]),
+            ):
+                event_name, args = event["event_name"], event["args"]
+                if event_name == "InitiateTrade":
+                    self.queued_trades[args["queueId"]] = args["queuedTime"]
+                elif event_name in ("OpenTrade", "CancelTrade"):
+                    self.queued_trades.pop(args["queueId"], None)
+                elif event_name == "Create":
+                    created_options.append((event["address"], args["id"]))
+                elif event_name in ("Expire", "Exercise"):
+                    option = (event["address"], args["id"])
+                    self.open_options.remove(option)
+                    if option in created_options:
+                        created_options.remove(option)
+
+        if created_options:
+            # Create doesn't carry the expiration, read it for the ones still open
+            self.open_options.update(self._get_expirations(created_options))
+
+        event_names = set(
+            (router_logs + options_logs) | select(lambda x: x["event_name"])
+        )
+        if event_names:
+            for listener in self.listeners:
+                listener(event_names)
+
+    def sync(self):
+        latest_block = self.web3.eth.block_number - INDEXER_CONFIRMATIONS
+        if self.next_block is None:
+            start_block = int(
+                os.environ.get(
+                    "INDEXER_START_BLOCK", latest_block - INDEXER_LOOKBACK_BLOCKS
+                )
+            )
+            if self.seed:
+                self.load(*self.seed(self.environment))
+            self.next_block = start_block
+            logger.info(f"Indexing {self.environment} from block {self.next_block}")
+
+        while self.next_block <= latest_block and not self.stopped.is_set():
+            to_block, logs = self._fetch_range(self.next_block, latest_block)
+            self.apply(logs)
+            self.next_block = to_block + 1
+            self.head = latest_block
+            logger.debug(f"Indexed up to {to_block}, {len(logs)} logs")
+        self.head = latest_block
+        if not self.stopped.is_set():
+            self.synced_at = time.time()
+
+    def load(self, queue_ids, open_options):
+        """Adds trades and options known to be queued and open"""
+        with self._lock:
+            for queue_id in queue_ids:
+                self.queued_trades.setdefault(queue_id, None)
+            self.open_options.update(open_options)
+        logger.info(
+            f"Seeded {self.environment} with {len(queue_ids)} queued trades and "
+            f"{len(open_options)} open options"
+        )
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                self.sync()
+            except Exception as e:
+                logger.exception(e)
+            self.stopped.wait(INDEXER_POLL_INTERVAL)
+
+    def start(self):
+        threading.Thread(
+            target=self.run, name=f"indexer-{self.environment}", daemon=True
+        ).start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+    def get_option_to_open(self):
+        """Same shape as `data_v2.get_option_to_open`"""
+        with self._lock:
+            queue_ids = sorted(self.queued_trades)
+        return list(queue_ids | select(lambda x: {"queueID": x, "state": 4}))
+
+    def get_option_to_execute(self, timestamp=None):
+        """Same shape as `data_v2.get_option_to_execute`"""
+        timestamp = timestamp or int(time.time())
+        return list(
+            self.open_options.get_expired(timestamp)
+            | select(
+                lambda x: {
+                    "optionID": x[0][1],
+                    "contractAddress": x[0][0],
+                    "expirationTime": x[1],
+                }
+            )
+        )
+
+
+def start_indexer(environment, seed=None):
+    if environment not in IndexerMap:
+        IndexerMap[environment] = EventIndexer(environment, seed=seed).start()
+    return IndexerMap[environment]
+
+
+def get_indexer(environment):
+    """
+    The running indexer for `environment` if it has caught up with the chain and
+    synced recently
+    """
+    indexer = IndexerMap.get(environment)
+    if indexer is not None and indexer.is_synced:
+        return indexer
+    return None
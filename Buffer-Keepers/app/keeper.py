@@ -6,9 +6,20 @@ import time
 import sentry_sdk
 from brownie import network
 from cache import cache
+from data_v2 import get_indexer_seed, get_session_stats
+from expiry_prefetch import ExpiryPrefetcher
 from github_push import push_to_repo_branch
 from helper_v2 import open, register_all_contracts, unlock_options
+from indexer import start_indexer
+from pipe import select
+from pipeline import OpenPipeline
+from price_stream import HermesPriceStream
+from rate_limiter import get_rate_limiter_stats
+from runtime import KeeperRuntime
 from telegram_bot_group_update import send_message as send_tg_message
+from triggers import ExpiryTrigger, NewBlockTrigger
+from vaa_prefetch import SpeculativePrefetcher
+from vaa_store import vaa_store
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
@@ -83,6 +94,35 @@ parser = argparse.ArgumentParser(description="Keeper Bots")
 parser.add_argument(
     "--bot",
     type=str,
+    help="Bot to run, a comma separated list with --asyncio",
+)
+parser.add_argument(
+    "--pipeline",
+    action="store_true",
+    help="Run the open bot as a staged pipeline instead of a loop",
+)
+parser.add_argument(
+    "--indexer",
+    action="store_true",
+    help="Find trades and options from eth_getLogs instead of theGraph",
+)
+parser.add_argument(
+    "--asyncio",
+    action="store_true",
+    help="Run all the bots in one process as tasks of an asyncio runtime",
+)
+parser.add_argument(
+    "--new-blocks",
+    action="store_true",
+    help="With --asyncio, wake the bots on every block (newHeads on WS_RPC)",
+)
+parser.add_argument(
+    "--prefetch-vaas",
+    nargs="?",
+    const="poll",
+    choices=("poll", "stream"),
+    help="Keep the latest updates of the active assets in memory, polled from "
+    "Hermes every second (default) or taken from its price stream",
 )
 environment = os.environ["ENVIRONMENT"]
 available_networks = os.environ["NETWORK"].split(",")
@@ -94,6 +134,9 @@ def save_checkpoint(bot_name):
     now = time.time()
     cache.set(cache_key, now)
     logger.info(f"Checkpoint saved for {bot_name}: {now}")
+    logger.debug(f"HTTP sessions: {get_session_stats()}")
+    logger.debug(f"Rate limiters: {get_rate_limiter_stats()}")
+    logger.debug(f"VAA store: {vaa_store.get_stats()}")
 
 
 def infinite_loop(bot_name, func):
@@ -117,7 +160,22 @@ def infinite_loop(bot_name, func):
     return wrapper
 
 
-def main(bot_name):
+def start_event_indexer(bot_names):
+    # theGraph is used until the indexer catches up with the chain
+    event_indexer = start_indexer(environment, seed=get_indexer_seed)
+    if "close" in bot_names:
+        ExpiryPrefetcher(environment, event_indexer.open_options).start()
+    return event_indexer
+
+
+def start_vaa_prefetcher(bot_names, source):
+    if source == "stream":
+        HermesPriceStream(environment).start()
+    elif "open" in bot_names:
+        SpeculativePrefetcher(environment).start()
+
+
+def main(bot_name, pipeline=False, indexer=False, prefetch_vaas=None):
     if bot_name == "monitor_keeper":
         infinite_loop(bot_name, monitor_keeper)(environment)
         raise SystemExit(1)
@@ -126,15 +184,60 @@ def main(bot_name):
             logger.info(f"Invalid bot name {bot_name}")
             raise ValueError(f"Invalid bot name {bot_name}")
         register_all_contracts(environment)
+        if indexer:
+            start_event_indexer([bot_name])
+        if prefetch_vaas:
+            start_vaa_prefetcher([bot_name], prefetch_vaas)
         # network.connect(available_networks[current_network_index])
         logger.info(f"connected {network.show_active()}")
 
         logger.info(f"Starting {bot_name}...")
-        infinite_loop(bot_name, BOT_FUNCTION_MAPPING[bot_name])(environment)
+        if pipeline and bot_name == "open":
+            OpenPipeline(environment, on_cycle=lambda: save_checkpoint(bot_name)).run()
+        else:
+            infinite_loop(bot_name, BOT_FUNCTION_MAPPING[bot_name])(environment)
         logger.info(f"Exiting {bot_name}...")
         raise SystemExit(1)  # Doing this so the process can be restarted by Railway
 
 
+def main_async(bot_names, indexer=False, new_blocks=False, prefetch_vaas=None):
+    for bot_name in bot_names:
+        if bot_name not in BOT_FUNCTION_MAPPING:
+            logger.info(f"Invalid bot name {bot_name}")
+            raise ValueError(f"Invalid bot name {bot_name}")
+    register_all_contracts(environment)
+
+    triggers = []
+    if new_blocks:
+        triggers.append(NewBlockTrigger(environment))
+    event_indexer = None
+    if indexer:
+        event_indexer = start_event_indexer(bot_names)
+        if "close" in bot_names:
+            triggers.append(ExpiryTrigger(event_indexer.open_options))
+    if prefetch_vaas:
+        start_vaa_prefetcher(bot_names, prefetch_vaas)
+
+    runtime = KeeperRuntime(
+        environment,
+        dict(bot_names | select(lambda x: (x, BOT_FUNCTION_MAPPING[x]))),
+        on_cycle=save_checkpoint,
+        triggers=triggers,
+    )
+    if event_indexer:
+        event_indexer.listeners.append(runtime.on_events)
+
+    logger.info(f"Starting {', '.join(bot_names)}...")
+    runtime.run()
+    logger.info(f"Exiting {', '.join(bot_names)}...")
+    raise SystemExit(1)  # Doing this so the process can be restarted by Railway
+
+
 if __name__ == "__main__":
     args = parser.parse_args()
-    main(args.bot)
+    if args.asyncio:
+        main_async(
+            args.bot.split(","), args.indexer, args.new_blocks, args.prefetch_vaas
+        )
+    else:
+        main(args.bot, args.pipeline, args.indexer, args.prefetch_vaas)
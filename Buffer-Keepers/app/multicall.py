@@ -9,8 +9,8 @@ def multicall(contract_functions, environment, default_block="latest"):
     return m.aggregate(contract_functions)
 
 
-def test_cached_multicall(calls, environment, index, default_block="latest"):
-    result = cached_multicall(calls, environment, index, default_block)
+def test_cached_multicall(calls, environment, default_block="latest"):
+    result = cached_multicall(calls, environment, default_block)
 
     by_parts_results = []
     for call in calls:
@@ -19,7 +19,6 @@ def test_cached_multicall(calls, environment, index, default_block="latest"):
                 contract_address=call[0],
                 abi_path=call[1],
                 environment=environment,
-                index=index,
             ).read(call[2], *call[3:], default_block=default_block)
         )
     assert by_parts_results == result, "Multicall should be equivalent to regular read"
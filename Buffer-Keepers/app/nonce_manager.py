@@ -0,0 +1,151 @@
+"""
+Local nonce allocation per (environment, keeper account).
+
+Nonces are handed out from memory so several txns can be in flight at once, up
+to MAX_OUTSTANDING_TXNS. The counter starts from the chain's pending count and
+is re-synced with it whenever a send or a confirmation fails, once the nonces
+allocated but not sent yet are either sent or released. The highest sent nonce
+is also kept in Redis, a restarted keeper only warns when it doesn't match the
+chain: txns dropped from the mempool would otherwise leave a gap that every new
+txn waits behind.
+"""
+import logging
+import os
+import threading
+
+from cache import cache
+
+logger = logging.getLogger(__name__)
+
+MAX_OUTSTANDING_TXNS = int(os.environ.get("MAX_OUTSTANDING_TXNS", 4))
+# Longest a reconcile waits for the allocated nonces to be sent, in seconds
+NONCE_RECONCILE_TIMEOUT = float(os.environ.get("NONCE_RECONCILE_TIMEOUT", 30))
+
+# (environment, account) => NonceManager
+NonceManagerMap = {}
+_nonce_manager_lock = threading.Lock()
+
+# txn_hash => (NonceManager, nonce) for the txns sent but not confirmed yet
+PendingTxnMap = {}
+
+
+class NonceManager:
+    def __init__(self, environment, account, web3):
+        self.environment = environment
+        self.account = account
+        self.web3 = web3
+        self.cache_key = f"{environment}-{account}-next_nonce"
+        self.next_nonce = None
+        self.highest_sent_nonce = -1
+        self.outstanding = set()
+        self.unsent = set()  # allocated but not sent yet
+        self.reconciling = 0
+        self._lock = threading.Condition()
+        self._slots = threading.BoundedSemaphore(MAX_OUTSTANDING_TXNS)
+
+    def _chain_nonce(self):
+        return self.web3.eth.getTransactionCount(self.account, "pending")
+
+    def _sync(self):
+        self.next_nonce = self._chain_nonce()
+        persisted_nonce = cache.get(self.cache_key)
+        if persisted_nonce is not None and int(persisted_nonce) != self.next_nonce:
+            logger.warning(
+                f"Nonce of {self.environment}-{self.account} was {persisted_nonce} "
+                f"before the restart, the chain is at {self.next_nonce}"
+            )
+        logger.info(
+            f"Nonce synced for {self.environment}-{self.account}: {self.next_nonce}"
+        )
+
+    def allocate(self):
+        """Blocks while MAX_OUTSTANDING_TXNS txns are already in flight"""
+        self._slots.acquire()
+        try:
+            with self._lock:
+                self._lock.wait_for(lambda: not self.reconciling)
+                if self.next_nonce is None:
+                    self._sync()
+                nonce = self.next_nonce
+                self.next_nonce += 1
+                self.outstanding.add(nonce)
+                self.unsent.add(nonce)
+                return nonce
+        except Exception:
+            self._slots.release()
+            raise
+
+    def sent(self, nonce, txn_hash):
+        with self._lock:
+            PendingTxnMap[txn_hash] = (self, nonce)
+            self._sent(nonce)
+            self.highest_sent_nonce = max(self.highest_sent_nonce, nonce)
+            cache.set(self.cache_key, self.highest_sent_nonce + 1)
+
+    def release(self, nonce):
+        with self._lock:
+            if nonce not in self.outstanding:
+                return
+            self.outstanding.discard(nonce)
+            self._sent(nonce)
+        self._slots.release()
+
+    def _sent(self, nonce):
+        self.unsent.discard(nonce)
+        if not self.unsent:
+            self._lock.notify_all()
+
+    def reconcile(self):
+        """
+        Drops the local counter back to what the chain has accepted. New
+        allocations are held off and the ones already handed out are waited for,
+        up to NONCE_RECONCILE_TIMEOUT, so none is reused while it's being sent.
+        """
+        with self._lock:
+            self.reconciling += 1
+            try:
+                if not self._lock.wait_for(
+                    lambda: not self.unsent, timeout=NONCE_RECONCILE_TIMEOUT
+                ):
+                    logger.warning(
+                        f"Reconciling {self.environment}-{self.account} with "
+                        f"unsent nonces {sorted(self.unsent)}"
+                    )
+                chain_nonce = self._chain_nonce()
+                logger.info(
+                    f"Nonce reconciled for {self.environment}-{self.account}: "
+                    f"{self.next_nonce} => {chain_nonce}"
+                )
+                self.next_nonce = chain_nonce
+                self.highest_sent_nonce = chain_nonce - 1
+                cache.set(self.cache_key, chain_nonce)
+            finally:
+                self.reconciling -= 1
+                self._lock.notify_all()
+
+    def failed(self, nonce):
+        self.release(nonce)
+        self.reconcile()
+
+
+def get_nonce_manager(environment, account, web3):
+    key = (environment, account)
+    nonce_manager = NonceManagerMap.get(key)
+    if nonce_manager is None:
+        with _nonce_manager_lock:
+            nonce_manager = NonceManagerMap.get(key)
+            if nonce_manager is None:
+                nonce_manager = NonceManager(environment, account, web3)
+                NonceManagerMap[key] = nonce_manager
+    return nonce_manager
+
+
+def txn_done(txn_hash, failed=False):
+    """Frees the nonce slot of a txn sent through a NonceManager"""
+    nonce_manager, nonce = PendingTxnMap.pop(txn_hash, (None, None))
+    if nonce_manager is None:
+        return
+    if failed:
+        nonce_manager.failed(nonce)
+    else:
+        nonce_manager.release(nonce)
@@ -0,0 +1,196 @@
+"""
+Staged pipeline for the open keeper:
+
+    discover -> enrich -> price -> submit -> confirm
+
+Every stage runs on its own thread and hands batches to the next one through a
+bounded queue, so the next batch is being discovered and priced while the
+previous resolveQueuedTrades txns confirm. Once priced, a batch is split into
+txns by `build_batches`, under CALLDATA_MAX_BYTES_PER_TXN and GAS_LIMIT_PER_TXN.
+A queue id is kept in `in_flight` from the moment it's discovered until its txn
+is confirmed or it's dropped by a stage, so it's never submitted twice.
+"""
+import logging
+import os
+import threading
+from queue import Empty, Full, Queue
+
+import contract
+from batch import batch
+from config import ROUTER
+from gas_model import get_batch_size
+from helper_v2 import (
+    build_batches,
+    get_payload_fee,
+    get_resolve_payload,
+    get_unresolved_trades,
+    iter_queue_ids,
+    send_resolve_queued_trades,
+)
+from pipe import select, where
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_QUEUE_SIZE = int(os.environ.get("PIPELINE_QUEUE_SIZE", 2))
+QUEUE_POLL_INTERVAL = 1
+
+
+class OpenPipeline:
+    def __init__(self, environment, on_cycle=None):
+        self.environment = environment
+        self.on_cycle = on_cycle
+        self.delay = float(os.environ.get("DELAY", 1))
+        self.in_flight = set()
+        self._in_flight_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.enrich_queue = Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        self.price_queue = Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        self.submit_queue = Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        # Bounds the number of txns waiting for confirmation
+        self.confirm_queue = Queue(maxsize=PIPELINE_QUEUE_SIZE)
+
+    def _release(self, queue_ids):
+        with self._in_flight_lock:
+            self.in_flight.difference_update(queue_ids)
+
+    def _put(self, queue, item):
+        while not self.stopped.is_set():
+            try:
+                queue.put(item, timeout=QUEUE_POLL_INTERVAL)
+                return True
+            except Full:
+                continue
+        return False
+
+    def discover(self):
+        """
+        Yields batches of new queue ids as the pages come in, of about the
+        number of trades a txn takes. The txns themselves are cut by the price
+        stage once the size of their calldata is known.
+        """
+        for queue_ids in iter_queue_ids(self.environment):
+            with self._in_flight_lock:
+                new_queue_ids = list(
+                    queue_ids | where(lambda x: x not in self.in_flight)
+                )
+                self.in_flight.update(new_queue_ids)
+            yield from (
+                new_queue_ids
+                | batch(get_batch_size(self.environment, "resolveQueuedTrades"))
+                | select(lambda x: {"queue_ids": x})
+            )
+
+    def enrich(self, item):
+        trades = get_unresolved_trades(item["queue_ids"], self.environment)
+        if not trades:
+            return None
+        return {
+            "queue_ids": list(trades | select(lambda x: x["queueId"])),
+            "trades": trades,
+        }
+
+    def price(self, item):
+        payload = get_resolve_payload(item["trades"], self.environment)
+        if not payload:
+            return None
+        return {
+            "queue_ids": list(payload | select(lambda x: x[0])),
+            "batches": list(
+                build_batches(payload, "resolveQueuedTrades", self.environment)
+                | select(lambda x: (x, get_payload_fee(x.items, self.environment)))
+            ),
+        }
+
+    def submit(self, item):
+        """
+        Sends a txn per batch. After a failed send the remaining batches are
+        dropped, only the queue ids of the txns sent are kept for confirmation.
+        """
+        queue_ids = []
+        txn_hashes = []
+        for builder, total_fee in item["batches"]:
+            try:
+                txn_hashes.append(
+                    send_resolve_queued_trades(builder, total_fee, self.environment)
+                )
+            except Exception as e:
+                logger.exception(e)
+                break
+            queue_ids.extend(builder.items | select(lambda x: x[0]))
+        if not txn_hashes:
+            return None
+        return {"queue_ids": queue_ids, "txn_hashes": txn_hashes}
+
+    def confirm(self, item):
+        router_contract = contract.ContractRegistryMap[self.environment][
+            ROUTER[self.environment]
+        ]
+        for txn_hash in item["txn_hashes"]:
+            try:
+                router_contract.wait_for_txn(txn_hash)
+                events = contract.decode_txn(txn_hash, self.environment)
+                logger.info(f"events: {(events)}")
+            except Exception as e:
+                logger.exception(e)
+        return None
+
+    def _discover_loop(self):
+        while not self.stopped.is_set():
+            try:
+                for item in self.discover():
+                    self._put(self.enrich_queue, item)
+                if self.on_cycle:
+                    self.on_cycle()
+            except Exception as e:
+                logger.exception(e)
+            self.stopped.wait(self.delay)
+
+    def _stage_loop(self, stage, in_queue, out_queue):
+        while not self.stopped.is_set():
+            try:
+                item = in_queue.get(timeout=QUEUE_POLL_INTERVAL)
+            except Empty:
+                continue
+
+            result = None
+            try:
+                result = stage(item)
+            except Exception as e:
+                logger.exception(e)
+
+            # Anything not handed over to the next stage is out of the pipeline
+            handed_over = (
+                result is not None
+                and out_queue is not None
+                and self._put(out_queue, result)
+            )
+            dropped = set(item["queue_ids"])
+            if handed_over:
+                dropped -= set(result["queue_ids"])
+            self._release(dropped)
+
+    def run(self):
+        threads = [
+            threading.Thread(target=self._discover_loop, name="discover"),
+            *[
+                threading.Thread(
+                    target=self._stage_loop,
+                    args=(stage, in_queue, out_queue),
+                    name=stage.__name__,
+                )
+                for stage, in_queue, out_queue in [
+                    (self.enrich, self.enrich_queue, self.price_queue),
+                    (self.price, self.price_queue, self.submit_queue),
+                    (self.submit, self.submit_queue, self.confirm_queue),
+                    (self.confirm, self.confirm_queue, None),
+                ]
+            ],
+        ]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def stop(self):
+        self.stopped.set()
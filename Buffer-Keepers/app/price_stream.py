@@ -0,0 +1,109 @@
+"""
+Long-lived consumer of Hermes' price update stream (server-sent events on
+`/v2/updates/price/stream`) for the active assets. Every update is split by
+feed and kept in `vaa_store` under its publish time, so the VAA of a queued
+trade or an expired option is a lookup instead of a request per trade.
+
+The stream is reopened when the active assets change, when Hermes closes it
+(it does after a day) or when it goes quiet for longer than the read timeout.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+from accumulator import split_by_feed
+from asset_registry import asset_registry
+from data_v2 import get_session
+from pipe import select
+from vaa_store import mark_configured_assets, vaa_store
+
+logger = logging.getLogger(__name__)
+
+# How often the active assets are compared with the ones streamed, in seconds
+PRICE_STREAM_RESUBSCRIBE_INTERVAL = 10
+PRICE_STREAM_MAX_BACKOFF = 30
+
+
+class HermesPriceStream:
+    def __init__(self, environment, assets=None, endpoint=None):
+        """:param assets: as for `vaa_store.mark_configured_assets`"""
+        self.environment = environment
+        self.endpoint = endpoint or os.environ.get("PYTH_ENDPOINT", "")
+        mark_configured_assets(assets)
+        self.feed_ids = []
+        self.events = 0
+        self.failures = 0
+        self.stopped = threading.Event()
+
+    def get_feed_ids(self):
+        return sorted(
+            vaa_store.get_active_assets() | select(lambda x: asset_registry.feed_ids[x])
+        )
+
+    def on_event(self, event):
+        """Stores the update of every feed of a stream event"""
+        publish_times = dict(
+            event.get("parsed", [])
+            | select(lambda x: ("0x" + x["id"].lower(), x["price"]["publish_time"]))
+        )
+        for update_data in event["binary"]["data"]:
+            for feed_id, vaa in split_by_feed(update_data).items():
+                asset_id = asset_registry.get_id(feed_id)
+                if asset_id is not None and feed_id in publish_times:
+                    vaa_store.put(asset_id, int(publish_times[feed_id]), vaa)
+        self.events += 1
+
+    def consume(self):
+        """Streams self.feed_ids until they're no longer the active ones"""
+        response = get_session("hermes_stream").get(
+            self.endpoint + "/v2/updates/price/stream",
+            params={"ids[]": self.feed_ids, "encoding": "hex", "parsed": "true"},
+            stream=True,
+        )
+        with response:
+            response.raise_for_status()
+            logger.info(f"Streaming prices of {len(self.feed_ids)} feeds")
+            checked_at = time.time()
+            for line in response.iter_lines(decode_unicode=True):
+                if line and line.startswith("data:"):
+                    self.on_event(json.loads(line[len("data:") :]))
+                    self.failures = 0
+                if self.stopped.is_set():
+                    return
+                if time.time() - checked_at > PRICE_STREAM_RESUBSCRIBE_INTERVAL:
+                    checked_at = time.time()
+                    if self.get_feed_ids() != self.feed_ids:
+                        return
+        raise ConnectionError("Price stream closed by Hermes")
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.feed_ids = self.get_feed_ids()
+            if not self.feed_ids:
+                self.stopped.wait(PRICE_STREAM_RESUBSCRIBE_INTERVAL)
+                continue
+            try:
+                self.consume()
+            except Exception as e:
+                self.failures += 1
+                backoff = min(2**self.failures, PRICE_STREAM_MAX_BACKOFF)
+                logger.warning(f"Price stream failed, reopening in {backoff}s: {e}")
+                self.stopped.wait(backoff)
+
+    def start(self):
+        threading.Thread(
+            target=self.run, name=f"price-stream-{self.environment}", daemon=True
+        ).start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+    def get_stats(self):
+        return {
+            "feeds": len(self.feed_ids),
+            "events": self.events,
+            "failures": self.failures,
+        }
@@ -0,0 +1,251 @@
+"""
+web3 provider spreading the RPC calls over several endpoints.
+
+Every endpoint is scored from its latency and error rate. Calls go to the best
+scored endpoint and fail over to the next ones. `eth_call`s are hedged: when
+the first endpoint hasn't answered after its p95 latency the call is also sent
+to the next one and the first answer wins. `eth_sendRawTransaction` is
+broadcast to the RPC_BROADCAST_FANOUT best endpoints. An endpoint that fails or
+throttles us is skipped for RPC_COOLDOWN seconds.
+
+Calls reading state that has to agree with the previous calls (the pending
+nonce, the logs up to the block number we just read, receipts) go to one sticky
+endpoint, as endpoints lag behind each other. It's kept until it fails and is
+always part of the broadcasts, so it knows about the txns we sent.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+
+from web3.providers.base import BaseProvider
+
+logger = logging.getLogger(__name__)
+
+HEDGED_METHODS = ("eth_call",)
+BROADCAST_METHODS = ("eth_sendRawTransaction",)
+STICKY_METHODS = (
+    "eth_blockNumber",
+    "eth_getLogs",
+    "eth_getTransactionCount",
+    "eth_getTransactionReceipt",
+)
+RPC_BROADCAST_FANOUT = int(os.environ.get("RPC_BROADCAST_FANOUT", 3))
+RPC_HEDGE_MIN_DELAY = 0.05
+RPC_HEDGE_MAX_DELAY = 2
+# Hedge delay until an endpoint has enough latency samples
+RPC_HEDGE_DEFAULT_DELAY = 0.5
+RPC_COOLDOWN = float(os.environ.get("RPC_COOLDOWN", 5))
+LATENCY_SAMPLES = 100
+MIN_LATENCY_SAMPLES = 10
+EWMA_ALPHA = 0.2
+# JSON-RPC error codes providers use when throttling
+RATE_LIMIT_ERROR_CODES = (-32005, 429)
+
+
+class ProviderUnavailable(Exception):
+    pass
+
+
+class EndpointHealth:
+    def __init__(self, endpoint_uri):
+        self.endpoint_uri = endpoint_uri
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.latency = None  # EWMA, in seconds
+        self.error_rate = 0.0  # EWMA
+        self.requests = 0
+        self.errors = 0
+        self.down_until = 0
+        self._lock = threading.Lock()
+
+    def record_success(self, latency):
+        with self._lock:
+            self.requests += 1
+            self.latencies.append(latency)
+            self.latency = (
+                latency
+                if self.latency is None
+                else EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.latency
+            )
+            self.error_rate *= 1 - EWMA_ALPHA
+
+    def record_failure(self):
+        with self._lock:
+            self.requests += 1
+            self.errors += 1
+            self.error_rate = EWMA_ALPHA + (1 - EWMA_ALPHA) * self.error_rate
+            self.down_until = time.time() + RPC_COOLDOWN
+
+    @property
+    def is_down(self):
+        return time.time() < self.down_until
+
+    @property
+    def score(self):
+        """Expected latency weighted by the error rate, lower is better"""
+        latency = self.latency if self.latency is not None else RPC_HEDGE_DEFAULT_DELAY
+        return latency * (1 + 10 * self.error_rate)
+
+    def p95(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+        if len(latencies) < MIN_LATENCY_SAMPLES:
+            return None
+        return latencies[int(0.95 * (len(latencies) - 1))]
+
+
+def _is_rate_limited(response):
+    error = response.get("error")
+    if not isinstance(error, dict):
+        return False
+    return (
+        error.get("code") in RATE_LIMIT_ERROR_CODES
+        or "rate limit" in str(error.get("message", "")).lower()
+    )
+
+
+class ProviderPool(BaseProvider):
+    def __init__(self, providers):
+        self.providers = providers
+        self.health = {
+            provider: EndpointHealth(provider.endpoint_uri) for provider in providers
+        }
+        self.executor = ThreadPoolExecutor(
+            max_workers=4 * len(providers), thread_name_prefix="rpc"
+        )
+        self.sticky = None
+        self._sticky_lock = threading.Lock()
+
+    def __str__(self):
+        return f"ProviderPool({', '.join(map(str, self.providers))})"
+
+    def ranked(self):
+        """Endpoints from the healthiest, the ones cooling down last"""
+        return sorted(
+            self.providers,
+            key=lambda x: (self.health[x].is_down, self.health[x].score),
+        )
+
+    def _request(self, provider, method, params):
+        health = self.health[provider]
+        start = time.time()
+        try:
+            response = provider.make_request(method, params)
+        except Exception:
+            health.record_failure()
+            raise
+        if _is_rate_limited(response):
+            health.record_failure()
+            raise ProviderUnavailable(f"{provider.endpoint_uri}: {response['error']}")
+        health.record_success(time.time() - start)
+        return response
+
+    def sticky_provider(self):
+        """The sticky endpoint, the healthiest one when it's cooling down"""
+        with self._sticky_lock:
+            if self.sticky is None or self.health[self.sticky].is_down:
+                self.sticky = self.ranked()[0]
+                logger.info(f"Sticky RPC endpoint: {self.sticky.endpoint_uri}")
+            return self.sticky
+
+    def _hedge_delay(self, provider):
+        p95 = self.health[provider].p95()
+        if p95 is None:
+            return RPC_HEDGE_DEFAULT_DELAY
+        return min(max(p95, RPC_HEDGE_MIN_DELAY), RPC_HEDGE_MAX_DELAY)
+
+    def _send(self, method, params, hedge):
+        """
+        Sends to the best endpoint and moves on to the next one when it fails or,
+        with `hedge`, when it's slower than its p95. The first answer wins.
+        """
+        providers = iter(self.ranked())
+        provider = next(providers)
+        pending = {self.executor.submit(self._request, provider, method, params)}
+        timeout = self._hedge_delay(provider) if hedge else None
+        last_error = None
+        while pending:
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    return future.result()
+                except Exception as e:
+                    last_error = e
+                    logger.info(f"RPC {method} failed: {e}")
+
+            next_provider = next(providers, None)
+            if next_provider is not None:
+                pending.add(
+                    self.executor.submit(self._request, next_provider, method, params)
+                )
+                if hedge:
+                    timeout = self._hedge_delay(next_provider)
+            elif not done:
+                # Nobody left to hedge with, wait for the ones in flight
+                timeout = None
+        raise last_error
+
+    def _send_sticky(self, method, params):
+        """
+        Sends to the sticky endpoint, a failure puts it down so the retry picks
+        another one.
+        """
+        last_error = None
+        for _ in self.providers:
+            try:
+                return self._request(self.sticky_provider(), method, params)
+            except Exception as e:
+                last_error = e
+                logger.info(f"RPC {method} failed: {e}")
+        raise last_error
+
+    def _broadcast(self, method, params):
+        """
+        Sends to several endpoints at once and returns the first successful
+        response, or the first error response when none succeeds.
+        """
+        sticky = self.sticky_provider()
+        providers = [sticky] + [x for x in self.ranked() if x is not sticky]
+        futures = [
+            self.executor.submit(self._request, provider, method, params)
+            for provider in providers[:RPC_BROADCAST_FANOUT]
+        ]
+        error_response = None
+        last_error = None
+        for future in as_completed(futures):
+            try:
+                response = future.result()
+            except Exception as e:
+                last_error = e
+                continue
+            if "error" not in response:
+                return response
+            error_response = error_response or response
+        if error_response is not None:
+            return error_response
+        raise last_error
+
+    def make_request(self, method, params):
+        if method in BROADCAST_METHODS:
+            return self._broadcast(method, params)
+        if method in STICKY_METHODS:
+            return self._send_sticky(method, params)
+        return self._send(method, params, hedge=method in HEDGED_METHODS)
+
+    def isConnected(self):
+        return any(provider.isConnected() for provider in self.providers)
+
+    def get_stats(self):
+        """{endpoint: {requests, errors, latency, p95, is_down}}"""
+        return {
+            health.endpoint_uri: {
+                "requests": health.requests,
+                "errors": health.errors,
+                "latency": health.latency,
+                "p95": health.p95(),
+                "is_down": health.is_down,
+            }
+            for health in self.health.values()
+        }
@@ -0,0 +1,141 @@
+"""
+Client-side token buckets pacing the calls to every RPC endpoint and external
+API, so that bursts of reads are spread out instead of being answered with 429s.
+
+Calls have a priority. Sending txns and polling receipts are PRIORITY_HIGH:
+they go before any waiting lower priority call and a share of every bucket is
+reserved for them, so bulk reads never starve them.
+"""
+import logging
+import os
+import threading
+import time
+
+from web3.providers.rpc import HTTPProvider
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+# limiter kind => (requests per second, burst)
+RATE_LIMITS = {
+    "rpc": (
+        float(os.environ.get("RPC_RATE_LIMIT", 25)),
+        int(os.environ.get("RPC_RATE_BURST", 50)),
+    ),
+    "graph": (float(os.environ.get("GRAPH_RATE_LIMIT", 5)), 10),
+    "oracle": (float(os.environ.get("ORACLE_RATE_LIMIT", 10)), 20),
+    "hermes": (float(os.environ.get("HERMES_RATE_LIMIT", 3)), 30),
+    # (Re)connections to the price stream
+    "hermes_stream": (0.2, 2),
+}
+# Share of every bucket only PRIORITY_HIGH calls can take
+RESERVED_SHARE = 0.1
+
+RPC_METHOD_PRIORITY = {
+    "eth_sendRawTransaction": PRIORITY_HIGH,
+    "eth_getTransactionReceipt": PRIORITY_HIGH,
+    "eth_getTransactionCount": PRIORITY_HIGH,
+    "eth_call": PRIORITY_LOW,
+    "eth_getLogs": PRIORITY_LOW,
+}
+
+# name => TokenBucket
+RateLimiterMap = {}
+_rate_limiter_lock = threading.Lock()
+
+
+class TokenBucket:
+    def __init__(self, name, rate, burst):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.reserved = burst * RESERVED_SHARE
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self.waiting = [0, 0, 0]  # by priority
+        self.requests = 0
+        self.throttled = 0
+        self.wait_time = 0.0
+        self._condition = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def _floor(self, priority):
+        return 1 if priority == PRIORITY_HIGH else 1 + self.reserved
+
+    def _can_take(self, priority):
+        if any(self.waiting[:priority]):
+            return False
+        return self.tokens >= self._floor(priority)
+
+    def acquire(self, priority=PRIORITY_NORMAL):
+        """Blocks until a token is available, returns the time waited"""
+        with self._condition:
+            self.requests += 1
+            self._refill()
+            if self._can_take(priority):
+                self.tokens -= 1
+                return 0
+
+            self.throttled += 1
+            self.waiting[priority] += 1
+            start = time.monotonic()
+            try:
+                while True:
+                    self._refill()
+                    if self._can_take(priority):
+                        self.tokens -= 1
+                        break
+                    missing = max(self._floor(priority) - self.tokens, 0)
+                    self._condition.wait(max(missing / self.rate, 0.001))
+            finally:
+                self.waiting[priority] -= 1
+                self._condition.notify_all()
+
+            waited = time.monotonic() - start
+            self.wait_time += waited
+            return waited
+
+    def get_stats(self):
+        return {
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "queued": sum(self.waiting),
+            "wait_time": round(self.wait_time, 3),
+        }
+
+
+def get_rate_limiter(name, kind=None):
+    """The process-wide bucket for `name`, sized by RATE_LIMITS[kind or name]"""
+    rate_limiter = RateLimiterMap.get(name)
+    if rate_limiter is None:
+        with _rate_limiter_lock:
+            rate_limiter = RateLimiterMap.get(name)
+            if rate_limiter is None:
+                rate_limiter = TokenBucket(name, *RATE_LIMITS[kind or name])
+                RateLimiterMap[name] = rate_limiter
+    return rate_limiter
+
+
+def get_rate_limiter_stats():
+    """{name: {requests, throttled, queued, wait_time}}"""
+    return {
+        name: rate_limiter.get_stats()
+        for name, rate_limiter in list(RateLimiterMap.items())
+    }
+
+
+class RateLimitedHTTPProvider(HTTPProvider):
+    """HTTPProvider taking a token from its endpoint's bucket for every call"""
+
+    def make_request(self, method, params):
+        get_rate_limiter(f"rpc:{self.endpoint_uri}", "rpc").acquire(
+            RPC_METHOD_PRIORITY.get(method, PRIORITY_NORMAL)
+        )
+        return super().make_request(method, params)
@@ -0,0 +1,132 @@
+"""
+asyncio runtime running several keeper bots in one process.
+
+Every bot is a task that runs one round of its (blocking) function on a worker
+thread and then waits until it's woken up, with DELAY as the longest wait. A
+bot is woken up by `notify`, e.g. when the indexer sees new work for it, so it
+doesn't sleep through work that's already there. All the bots share the
+process-wide web3 clients, HTTP sessions, caches and nonce managers.
+
+On SIGINT/SIGTERM no new round is started, the running ones are given
+SHUTDOWN_TIMEOUT seconds to finish and the tasks are cancelled after that.
+"""
+import asyncio
+import logging
+import os
+import signal
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+SHUTDOWN_TIMEOUT = float(os.environ.get("SHUTDOWN_TIMEOUT", 60))
+
+# bot => indexer events that mean there's work for it
+BOT_WAKE_EVENTS = {
+    "open": ("InitiateTrade",),
+}
+
+
+class KeeperRuntime:
+    def __init__(self, environment, bots, on_cycle=None, triggers=()):
+        """
+        :param bots: {bot_name: function(environment)}
+        :param on_cycle: called with the bot name on a worker thread after
+            every successful round
+        :param triggers: objects with a `run(runtime)` coroutine calling `notify`
+        """
+        self.environment = environment
+        self.bots = bots
+        self.on_cycle = on_cycle
+        self.triggers = list(triggers)
+        self.delay = float(os.environ.get("DELAY", 1))
+        self.wait_time = float(os.environ.get("WAIT_TIME", 1))
+        self.executor = ThreadPoolExecutor(
+            max_workers=len(bots), thread_name_prefix="keeper"
+        )
+        self.loop = None
+        self.tasks = {}
+        self.wake_up_events = {}
+        self.stopping = None
+
+    def notify(self, bot_name=None):
+        """Wakes up `bot_name`, or all the bots. Safe to call from any thread."""
+        if self.loop is None:
+            return
+        bot_names = [bot_name] if bot_name else list(self.wake_up_events)
+        for name in bot_names:
+            if name in self.wake_up_events:
+                self.loop.call_soon_threadsafe(self.wake_up_events[name].set)
+
+    def on_events(self, event_names):
+        """Indexer listener, wakes up the bots that have work in `event_names`"""
+        for bot_name, wake_events in BOT_WAKE_EVENTS.items():
+            if any(event_name in event_names for event_name in wake_events):
+                self.notify(bot_name)
+
+    async def _wait(self, bot_name, timeout):
+        try:
+            await asyncio.wait_for(self.wake_up_events[bot_name].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.wake_up_events[bot_name].clear()
+
+    async def run_bot(self, bot_name, func):
+        while not self.stopping.is_set():
+            try:
+                await self.loop.run_in_executor(self.executor, func, self.environment)
+                if self.on_cycle:
+                    await self.loop.run_in_executor(
+                        self.executor, self.on_cycle, bot_name
+                    )
+                timeout = self.delay
+            except Exception as e:
+                if "429" in str(e):
+                    logger.info(f"Handled rpc error {e}")
+                elif "unsupported block number" in str(e):
+                    logger.info(f"Handled rpc error {e}")
+                else:
+                    logger.exception(e)
+                timeout = self.wait_time
+            await self._wait(bot_name, timeout)
+        logger.info(f"Stopped {bot_name}")
+
+    def stop(self):
+        if not self.stopping.is_set():
+            logger.info("Stopping the keepers...")
+            self.stopping.set()
+            self.notify()
+
+    async def main(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+        self.wake_up_events = {bot_name: asyncio.Event() for bot_name in self.bots}
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            self.loop.add_signal_handler(sig, self.stop)
+
+        self.tasks = {
+            bot_name: asyncio.create_task(self.run_bot(bot_name, func), name=bot_name)
+            for bot_name, func in self.bots.items()
+        }
+        trigger_tasks = [
+            asyncio.create_task(trigger.run(self), name=type(trigger).__name__)
+            for trigger in self.triggers
+        ]
+        await self.stopping.wait()
+
+        for task in trigger_tasks:
+            task.cancel()
+        await asyncio.gather(*trigger_tasks, return_exceptions=True)
+
+        # Let the running rounds finish, their txns are already in flight
+        done, pending = await asyncio.wait(
+            self.tasks.values(), timeout=SHUTDOWN_TIMEOUT
+        )
+        for task in pending:
+            logger.warning(f"{task.get_name()} didn't stop in time, cancelling")
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        # The rounds still running after the timeout are abandoned, not joined
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def run(self):
+        asyncio.run(self.main())
@@ -2,6 +2,7 @@ import json
 import logging
 import os
 import time
+from functools import lru_cache
 from json.decoder import JSONDecodeError
 from typing import Optional
 
@@ -11,9 +12,14 @@ from cache import cache
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=None)
 def get_abi(
     abi_path: str,
 ):
+    """
+    Parsed once per path and shared by every caller, so the returned ABI must not
+    be mutated.
+    """
     with open(abi_path) as f:
         abi = json.load(f)
     return abi
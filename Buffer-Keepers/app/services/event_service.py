@@ -0,0 +1,93 @@
+"""
+Event decoding tables compiled once per ABI.
+
+Every event of an ABI is compiled into an EventDecoder keyed by its topic0, so
+decoding a log is a dict lookup plus one `decode_abi` call. Topics are computed
+from the canonical signature, tuple (struct) arguments included.
+"""
+import logging
+from functools import lru_cache
+from typing import Any, Dict
+
+from eth_abi import decode_abi, decode_single
+from eth_utils import event_abi_to_log_topic
+from eth_utils.abi import collapse_if_tuple
+from hexbytes import HexBytes
+from services.abi_service import get_abi
+from web3._utils.abi import map_abi_data
+from web3._utils.normalizers import BASE_RETURN_NORMALIZERS
+from web3.datastructures import AttributeDict
+
+logger = logging.getLogger(__name__)
+
+
+def _is_hashed_when_indexed(abi_type):
+    # Indexed reference types only carry the keccak of their value
+    return (
+        abi_type in ("string", "bytes")
+        or abi_type.endswith("]")
+        or abi_type.startswith("(")
+    )
+
+
+class EventDecoder:
+    def __init__(self, event_abi):
+        self.abi = event_abi
+        self.name = event_abi["name"]
+        self.topic = event_abi_to_log_topic(event_abi)
+        inputs = event_abi["inputs"]
+        self.names = [x["name"] for x in inputs]
+        self.indexed = [
+            (x["name"], collapse_if_tuple(x)) for x in inputs if x.get("indexed")
+        ]
+        self.data_names = [x["name"] for x in inputs if not x.get("indexed")]
+        self.data_types = [collapse_if_tuple(x) for x in inputs if not x.get("indexed")]
+
+    def decode(self, log):
+        topics = log["topics"]
+        if len(topics) != len(self.indexed) + 1:
+            raise ValueError(
+                f"{self.name} expects {len(self.indexed)} indexed topics, "
+                f"got {len(topics) - 1}"
+            )
+
+        args = {}
+        for (name, abi_type), topic in zip(self.indexed, topics[1:]):
+            topic = HexBytes(topic)
+            if _is_hashed_when_indexed(abi_type):
+                args[name] = topic
+            else:
+                value = decode_single(abi_type, topic)
+                (args[name],) = map_abi_data(
+                    BASE_RETURN_NORMALIZERS, [abi_type], [value]
+                )
+
+        values = decode_abi(self.data_types, HexBytes(log["data"]))
+        values = map_abi_data(BASE_RETURN_NORMALIZERS, self.data_types, values)
+        args.update(zip(self.data_names, values))
+
+        return {
+            "event_name": self.name,
+            "args": AttributeDict({name: args[name] for name in self.names}),
+            "log_index": log["logIndex"],
+            "transaction_index": log["transactionIndex"],
+            "txhash": HexBytes(log["transactionHash"]),
+            "address": log["address"],
+            "blockHash": log.get("blockHash"),
+            "blockNumber": log.get("blockNumber"),
+        }
+
+
+@lru_cache(maxsize=None)
+def get_event_table(abi_path: str) -> Dict[bytes, Any]:
+    """topic0 => EventDecoder for all the events in the ABI at `abi_path`"""
+    decoders = [
+        EventDecoder(event_abi)
+        for event_abi in get_abi(abi_path)
+        if event_abi["type"] == "event" and not event_abi.get("anonymous")
+    ]
+    return {decoder.topic: decoder for decoder in decoders}
+
+
+def to_topic(topic):
+    return topic if isinstance(topic, bytes) else HexBytes(topic)
@@ -2,6 +2,7 @@
 Support for MakerDAO MultiCall contract
 """
 import logging
+import os
 from dataclasses import dataclass
 from typing import (
     Any,
@@ -24,7 +25,7 @@ from eth_abi.exceptions import DecodingError
 from eth_account.signers.local import LocalAccount
 from eth_typing import BlockIdentifier, BlockNumber, ChecksumAddress
 from hexbytes import HexBytes
-from services.web3_service import Contract
+from services.web3_service import get_contract_instance
 from web3 import Web3
 from web3._utils.abi import map_abi_data
 from web3._utils.normalizers import BASE_RETURN_NORMALIZERS
@@ -33,6 +34,20 @@ from web3.types import ABI, ABIEvent, ABIEventParams, ABIFunction, ABIFunctionPa
 
 logger = logging.getLogger(__name__)
 
+# Upper bounds for a single `aggregate` eth_call. Calls are packed into chunks
+# that stay under both limits; the gas bound keeps us below the node's eth_call
+# gas cap.
+MULTICALL_MAX_CALLDATA_BYTES = int(
+    os.environ.get("MULTICALL_MAX_CALLDATA_BYTES", 100_000)
+)
+MULTICALL_MAX_GAS = int(os.environ.get("MULTICALL_MAX_GAS", 25_000_000))
+MULTICALL_GAS_PER_CALL = int(os.environ.get("MULTICALL_GAS_PER_CALL", 30_000))
+# Per byte of calldata, same as the intrinsic gas of a non-zero byte
+CALLDATA_GAS_PER_BYTE = 16
+# Head of each (address, bytes) tuple: 32 byte offset, address, bytes offset and
+# length words
+_TARGET_WITH_DATA_OVERHEAD = 4 * 32
+
 
 @dataclass
 class MulticallResult:
@@ -93,7 +108,7 @@ class Multicall:
         environment: str,
         default_block="latest",
     ) -> None:
-        self.contract = Contract(
+        self.contract = get_contract_instance(
             contract_address=MULTICALL[environment],
             environment=environment,
             abi_path="./abis/MultiCallGnosis.json",
@@ -159,23 +174,75 @@ class Multicall:
             "aggregate", aggregate_parameter, default_block=self.default_block
         )
 
+    @staticmethod
+    def _chunk(
+        targets_with_data: Sequence[Tuple[ChecksumAddress, bytes]],
+    ) -> List[Tuple[int, int]]:
+        """
+        Splits the calls into contiguous chunks that respect the calldata and gas
+        limits of a single `aggregate` call.
+        :return: List of [start, end) index ranges
+        """
+        chunks = []
+        start = 0
+        size = 0
+        gas = 0
+        for index, (_, data) in enumerate(targets_with_data):
+            call_size = _TARGET_WITH_DATA_OVERHEAD + len(data)
+            call_gas = MULTICALL_GAS_PER_CALL + call_size * CALLDATA_GAS_PER_BYTE
+            if index > start and (
+                size + call_size > MULTICALL_MAX_CALLDATA_BYTES
+                or gas + call_gas > MULTICALL_MAX_GAS
+            ):
+                chunks.append((start, index))
+                start, size, gas = index, 0, 0
+            size += call_size
+            gas += call_gas
+        if start < len(targets_with_data):
+            chunks.append((start, len(targets_with_data)))
+        return chunks
+
+    def _call_one_by_one(
+        self, contract_functions: Sequence[ContractFunction]
+    ) -> List[Optional[Any]]:
+        results = []
+        for contract_function in contract_functions:
+            try:
+                results.append(
+                    contract_function.call(block_identifier=self.default_block)
+                )
+            except Exception:
+                logger.exception(
+                    f"Call failing for {contract_function.address}: {contract_function.fn_name}"
+                )
+                results.append(None)
+        return results
+
     def aggregate(
         self,
         contract_functions: Sequence[ContractFunction],
     ) -> List[Optional[Any]]:
         """
-        Calls ``aggregate`` on MakerDAO's Multicall contract. If a function called raises an error execution is stopped
+        Calls ``aggregate`` on MakerDAO's Multicall contract, one RPC per chunk. A chunk that
+        fails as a whole is retried call by call, the calls that still fail return `None`
         :param contract_functions:
-        :param block_identifier:
-        :return: A tuple with the ``blockNumber`` and a list with the decoded return values
-        :raises: BatchCallFunctionFailed
+        :return: A list with the decoded return values in the order of `contract_functions`
         """
         targets_with_data, output_types = self._build_payload(contract_functions)
-        block_number, results = self._aggregate(targets_with_data)
-        decoded_results = [
-            self._decode_data(output_type, data)
-            for output_type, data in zip(output_types, results)
-        ]
+        decoded_results: List[Optional[Any]] = []
+        for start, end in self._chunk(targets_with_data):
+            try:
+                block_number, results = self._aggregate(targets_with_data[start:end])
+            except Exception as e:
+                logger.warning(
+                    f"Multicall chunk [{start}:{end}] failing, falling back to single calls: {e}"
+                )
+                decoded_results += self._call_one_by_one(contract_functions[start:end])
+                continue
+            decoded_results += [
+                self._decode_data(output_type, data)
+                for output_type, data in zip(output_types[start:end], results)
+            ]
 
         return decoded_results
 
@@ -12,6 +12,10 @@ logger = logging.getLogger(__name__)
 
 READ_CACHE_TIME = 7
 
+# (environment, contract_address, id(abi)) => (abi, web3 contract). The abi is
+# kept in the value so its id can't be reused while the entry exists.
+_web3_contract_map = {}
+
 
 def get_read_cache_key(
     contract_address, environment, abi, function_name, default_block, *args
@@ -42,9 +46,15 @@ def read(
     contract_address = Web3.toChecksumAddress(contract_address)
 
     def get_contract_instance(default_block):
-        web3 = get_web3()
-        web3.eth.defaultBlock = default_block
-        return web3.eth.contract(address=contract_address, abi=abi)
+        # The client is shared process-wide, so the block is passed per call
+        # through `block_identifier` instead of mutating `eth.defaultBlock`.
+        web3 = get_web3(environment)
+        key = (environment, contract_address, id(abi))
+        _, contract_instance = _web3_contract_map.get(key, (None, None))
+        if contract_instance is None or contract_instance.web3 is not web3:
+            contract_instance = web3.eth.contract(address=contract_address, abi=abi)
+            _web3_contract_map[key] = (abi, contract_instance)
+        return contract_instance
 
     log_dump = f"Read Call: {contract_address}, {environment}, {default_block}, {function_name},  {args}"
     logger.info(log_dump if len(log_dump) < 200 else f"{log_dump[:200]}...")
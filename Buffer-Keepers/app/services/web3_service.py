@@ -2,6 +2,7 @@ import importlib
 import json
 import logging
 import os
+import threading
 import time
 from datetime import datetime
 from typing import Dict, List, Optional
@@ -9,19 +10,48 @@ from typing import Dict, List, Optional
 import config
 import pytz
 import requests
-import sha3
-from hexbytes import HexBytes
-from pipe import dedup, groupby, select, where
+from calldata import calldata_gas
+from eth_abi.exceptions import DecodingError
+from gas_model import (
+    GAS_LIMIT_MARGIN,
+    get_fee_params,
+    get_gas_model,
+    txn_mined,
+    txn_sent,
+)
+from nonce_manager import get_nonce_manager, txn_done
+from pipe import select, where
 from services.abi_service import get_abi
+from services.event_service import get_event_table, to_topic
 from services.read_service import read
 from utility import get_web3, to_aware_datetime
 from web3 import Web3
-from web3._utils.events import get_event_data
 from web3.gas_strategies.time_based import fast_gas_price_strategy
 
 logger = logging.getLogger(__name__)
 
 
+class ContractCalldata(object):
+    """
+    Stands in for a web3 ContractFunction in `Contract.publish_txn`, with the
+    calldata encoded beforehand so that its gas is known.
+    """
+
+    def __init__(self, web3, contract_address, calldata):
+        self.web3 = web3
+        self.contract_address = contract_address
+        self.calldata = Web3.toHex(calldata)
+
+    def estimateGas(self, transaction):
+        return self.web3.eth.estimate_gas(
+            {**transaction, "to": self.contract_address, "data": self.calldata}
+        )
+
+    def buildTransaction(self, transaction):
+        # publish_txn passes every field, nothing is left to fill in
+        return {**transaction, "to": self.contract_address, "data": self.calldata}
+
+
 class Contract(object):
     def __init__(
         self,
@@ -34,17 +64,28 @@ class Contract(object):
         # self.web3 = get_web3(get_read_provider(environment))
         self.abi_path = abi_path
         self.abi = get_abi(abi_path)
+        self.event_table = get_event_table(abi_path)
+        self.event_topics = {
+            decoder.name: topic for topic, decoder in self.event_table.items()
+        }
         self.mappings: Dict[str, str] = {}
         self.on_block_mappings: List[str] = []
         self.events_to_scan = None
+        self._contract_instance = None
 
     @property
     def web3(self):
-        return get_web3()
+        return get_web3(self.environment)
 
     @property
     def contract_instance(self):
-        return self.web3.eth.contract(address=self.contract_address, abi=self.abi)
+        # Built once per web3 client instead of on every call
+        web3 = self.web3
+        if self._contract_instance is None or self._contract_instance.web3 is not web3:
+            self._contract_instance = web3.eth.contract(
+                address=self.contract_address, abi=self.abi
+            )
+        return self._contract_instance
 
     def get_checksum_address(self, address):
         try:
@@ -54,95 +95,82 @@ class Contract(object):
         return checksum_address
 
     def decode_txn(self, data):
-        data = dict(
-            data
-            | dedup(lambda x: (x["transactionHash"], x["logIndex"]))
-            | select(lambda x: self.decode_log(event_name=None, logs=x))
-            | where(lambda x: x != None)
-            | groupby(lambda x: x["event_name"])
-            | select(lambda x: (x[0], list(x[1] | select(lambda x: x["args"]))))
-        )
-        logger.debug(f"Found {len(data)} events!")
-        return data
+        """Decodes the logs in a single pass, {event_name: [args]}"""
+        events = {}
+        seen = set()
+        for log in data:
+            log_key = (log["transactionHash"], log["logIndex"])
+            if log_key in seen:
+                continue
+            seen.add(log_key)
+            decoded_event = self.decode_log(event_name=None, logs=log)
+            if decoded_event is not None:
+                events.setdefault(decoded_event["event_name"], []).append(
+                    decoded_event["args"]
+                )
+        logger.debug(f"Found {len(events)} events!")
+        return events
 
     def decode_log(self, event_name, logs):
+        """
+        eg. event = {
+            "event_name": event_name,
+            "log_index": log_index,
+            "transaction_index": transaction_index,
+            "txhash": txhash,
+            "address": event.address,
+            "blockHash": block_hash,
+            "blockNumber": block_number,
+            "args": event["args"]
+        }
+        Returns None for logs that aren't events of this contract.
+        """
+        topics = logs["topics"]
+        if not topics:
+            return None
+        decoder = self.event_table.get(to_topic(topics[0]))
+        if decoder is None or (event_name and decoder.name != event_name):
+            return None
         try:
-            """
-            eg. event = {
-                "event_name": event_name,
-                "timestamp": block_when,
-                "log_index": log_index,
-                "transaction_index": transaction_index,
-                "txhash": txhash,
-                "block_number": block_number,
-                "address": event.address,
-                "args": event["args"]
-            }
-            """
-            data = dict(logs)
-            data["topics"] = list(data["topics"] | where(lambda x: x != None))
-            data["topics"] = list(map(HexBytes, data["topics"]))
-
-            if not event_name:
-                event_name = self.get_event_name_for_topic(data["topics"][0])
-
-            data["transactionHash"] = HexBytes(data["transactionHash"])
-            # data["transactionIndex"] = (
-            #     int(data["transactionIndex"], 16) if data["transactionIndex"] != "0x" else 0
-            # )
-            # data["logIndex"] = int(data["logIndex"], 16) if data["logIndex"] != "0x" else 0
-            data["blockHash"] = data["transactionHash"]
-            # print(event_name)
-            decoded_event = dict(
-                get_event_data(self.web3.codec, self.get_event_abi(event_name), data)
-            )
-
-            # decoded_event["timestamp"] = to_aware_datetime(int(data["timeStamp"], 16))
-            # decoded_event["block_number"] = int(data.pop("blockNumber"), 16)
-
-            decoded_event["log_index"] = decoded_event.pop("logIndex")
-            decoded_event["transaction_index"] = decoded_event.pop("transactionIndex")
-            decoded_event["txhash"] = decoded_event.pop("transactionHash")
-            decoded_event["event_name"] = decoded_event.pop("event")
-            return decoded_event
-        except Exception as e:
-            # logger.exception(e)
+            return decoder.decode(logs)
+        except (DecodingError, ValueError) as e:
+            logger.warning(f"Couldn't decode {decoder.name} log: {e}")
             return None
 
-    # @retry_on_http_error()
-    def _get_nonce(self, private_key):
-        return self.web3.eth.getTransactionCount(self.get_account(private_key))
-
     def get_gas_price(self):
         self.web3.eth.set_gas_price_strategy(fast_gas_price_strategy)
         return int(self.web3.eth.generate_gas_price())
 
-    def write(self, function_name: str, *args, value=0):
+    def write(self, function_name: str, *args, value=0, wait=True):
+        # Batched functions take the list of items as their first argument
+        num_items = len(args[0]) if args and isinstance(args[0], list) else 1
+        calldata = Web3.toBytes(
+            hexstr=self.contract_instance.encodeABI(fn_name=function_name, args=args)
+        )
+        return self.write_calldata(
+            function_name, calldata, num_items, value=value, wait=wait
+        )
+
+    def write_calldata(self, function_name, calldata, num_items, value=0, wait=True):
+        """Same as `write` with the calldata of `function_name` encoded beforehand"""
         private_key = os.environ.get("KEEPER_ACCOUNT_PK")
+        gas_model = get_gas_model(self.environment, function_name)
         try:
             return self.publish_txn(
-                getattr(self.contract_instance.functions, function_name)(*args),
+                ContractCalldata(self.web3, self.contract_address, calldata),
                 value,
                 private_key,
+                wait=wait,
+                gas_model=gas_model,
+                num_items=num_items,
+                data_gas=calldata_gas(calldata),
             )
         except ValueError as e:
             if "replacement transaction underpriced" in str(e):
-                logger.info(f"Txn already underway for {(function_name, args, value)}")
-            if "already known" in str(e):
-                # the txn is already in the mempool so we need to speed up the txn
                 logger.info(
-                    "the txn is already in the mempool so we need to speed up the txn"
+                    f"Txn already underway for {(function_name, num_items, value)}"
                 )
-                actual_gas_price = self.get_gas_price()
-                logger.info(f"Trying with gas price {actual_gas_price}")
-                return self.publish_txn(
-                    getattr(self.contract_instance.functions, function_name)(*args),
-                    value,
-                    private_key,
-                    gas_price=actual_gas_price,
-                )
-            else:
-                raise e
+            raise e
 
     def f(self, function_name, *args):
         return getattr(self.contract_instance.functions, function_name)(*args)
@@ -155,44 +183,56 @@ class Contract(object):
             self.web3.eth.account.privateKeyToAccount(private_key).address
         )
 
-    def publish_txn(self, transfer_txn, value, private_key, gas_price=None):
-        nonce = self._get_nonce(private_key=private_key)
-        block = self.web3.eth.get_block("latest")
-        base_fee = block["baseFeePerGas"]
-
-        default_gas_price = int(config.GAS_PRICE[self.environment])
+    def publish_txn(
+        self,
+        transfer_txn,
+        value,
+        private_key,
+        wait=True,
+        gas_model=None,
+        num_items=1,
+        data_gas=0,
+    ):
+        """
+        Signs and sends the txn with a nonce from the account's NonceManager. With
+        `wait` it also blocks until the txn is mined, otherwise it returns right
+        after sending so that more txns can be sent while this one confirms.
+        The gas limit comes from `gas_model` when it can predict one for
+        `num_items`, plus the calldata gas `data_gas`, otherwise from
+        `estimate_gas`. The nonce is only allocated once the txn is built, a txn
+        that reverts on estimation never takes one.
+        """
         account = self.get_account(private_key)
-
+        gas = gas_model.predict(num_items, data_gas) if gas_model else None
+        if gas is None:
+            estimated_gas = transfer_txn.estimateGas({"from": account, "value": value})
+            if gas_model:
+                gas_model.record(num_items, estimated_gas - data_gas)
+            gas = int(estimated_gas * GAS_LIMIT_MARGIN)
+
+        # Passing gas and fee fields explicitly keeps buildTransaction from
+        # fetching them again
         transfer_txn = transfer_txn.buildTransaction(
             {
                 "from": account,
                 "chainId": int(os.environ.get("CHAIN_ID")),
-                # "gas": 10_000_000,
-                # "gasPrice": gas_price if gas_price else default_gas_price,
-                # "gasPrice": self.get_gas_price(),
-                "nonce": nonce,
+                "gas": gas,
                 "value": value,
-                # "maxFeePerGas": base_fee * 2,
-                # "maxPriorityFeePerGas": gas_price if gas_price else default_gas_price,
+                **get_fee_params(self.environment, self.web3),
             }
         )
-        gas = self.web3.eth.estimate_gas(transfer_txn) * 1.5
-        transfer_txn.update({"gas": int(gas * 2)})
-
-        signed_txn = self.web3.eth.account.sign_transaction(
-            transfer_txn, private_key=private_key
-        )
 
+        nonce_manager = get_nonce_manager(self.environment, account, self.web3)
+        nonce = nonce_manager.allocate()
         try:
+            transfer_txn["nonce"] = nonce
+            signed_txn = self.web3.eth.account.sign_transaction(
+                transfer_txn, private_key=private_key
+            )
             self.web3.eth.sendRawTransaction(signed_txn.rawTransaction)
         except ValueError as e:
             error_message = str(e)
-            if "nonce too low" in error_message:
-                # TODO: if this gets stuck for too long then do something about it
-                logger.warning(
-                    f"nonce too low: {self.environment}-{account}. Skipping for now"
-                )
-            elif (
+            if (
                 "replacement transaction underpriced" in error_message
                 or "already known" in error_message
             ):
@@ -200,35 +240,45 @@ class Contract(object):
                 logger.warning(
                     f"Txn {self.environment}:{ Web3.toHex(signed_txn.hash)} still in progress"
                 )
-
-            else:
-                logger.exception(f"Write call failing for {self.environment}")
-        except requests.HTTPError as e:
-            if "Too Many Requests" in str(e):
-                # if its a testnet chain just ignore such errors
-                raise e
             else:
+                if "nonce too low" in error_message:
+                    logger.warning(
+                        f"nonce too low: {self.environment}-{account}. Resyncing with the chain"
+                    )
+                else:
+                    logger.exception(f"Write call failing for {self.environment}")
+                nonce_manager.failed(nonce)
                 raise e
-        except:
+        except requests.HTTPError as e:
+            nonce_manager.failed(nonce)
+            raise e
+        except Exception as e:
             logger.exception(f"Write call failing for {self.environment}")
+            nonce_manager.failed(nonce)
+            raise e
 
         txn_hash = self.web3.toHex(Web3.keccak(signed_txn.rawTransaction))
-        self.web3.eth.wait_for_transaction_receipt(txn_hash)
-        # receipt = self.web3.eth.getTransactionReceipt(txn_hash)
+        nonce_manager.sent(nonce, txn_hash)
+        if gas_model:
+            txn_sent(txn_hash, gas_model, num_items, data_gas)
+        if not wait:
+            return txn_hash
+
+        self.wait_for_txn(txn_hash)
+        return txn_hash
+
+    def wait_for_txn(self, txn_hash):
+        try:
+            receipt = self.web3.eth.wait_for_transaction_receipt(txn_hash)
+        except Exception as e:
+            txn_done(txn_hash, failed=True)
+            raise e
+        txn_done(txn_hash)
+        txn_mined(txn_hash, receipt)
         logger.info(
             f"View txn at https://{os.environ.get('EXPLORER', 'goerli.arbiscan.io')}/tx/{txn_hash}"
         )
-
-        new_nonce = self._get_nonce(private_key=private_key)
-        start_time = int(time.time())
-        while new_nonce == nonce:
-            if (int(time.time()) - start_time) > 60 * 2:
-                logger.info("Confirmation taking too long, leaving this for now...")
-                break
-            time.sleep(2)
-            new_nonce = self._get_nonce(private_key=private_key)
-
-        return txn_hash
+        return receipt
 
     def read(
         self, function_name: str, *args, default_block="latest", caller_address=None
@@ -244,41 +294,12 @@ class Contract(object):
         )
 
     def get_event_name_for_topic(self, topic0):
-        if not hasattr(self, "topic_to_event_name_mapping"):
-            self.topic_to_event_name_mapping = dict(
-                list(
-                    self.get_all_event_names()
-                    | select(
-                        lambda event_name: (self.get_topic(event_name), event_name)
-                    )
-                )
-            )
-        try:
-            if isinstance(topic0, HexBytes):
-                topic0 = topic0.hex()
-            return self.topic_to_event_name_mapping[topic0]
-        except:
-            event_abi = self.get_abi_for_topic(topic0)
-            return event_abi.get("name")
+        decoder = self.event_table.get(to_topic(topic0))
+        return decoder.name if decoder else None
 
     def get_abi_for_topic(self, topic0):
-        if isinstance(topic0, HexBytes):
-            topic0 = topic0.hex()
-        if hasattr(self, "topic_to_abi_mapping"):
-            return self.topic_to_abi_mapping[topic0]
-
-        self.topic_to_abi_mapping = dict(
-            list(
-                self.get_all_event_names()
-                | select(
-                    lambda event_name: (
-                        self.get_topic(event_name),
-                        self.get_event_abi(event_name),
-                    )
-                )
-            )
-        )
-        return self.topic_to_abi_mapping.get(topic0, {})
+        decoder = self.event_table.get(to_topic(topic0))
+        return decoder.abi if decoder else {}
 
     def get_all_event_types(self):
         return list(
@@ -315,25 +336,7 @@ class Contract(object):
         return data
 
     def get_topic(self, event_name):
-        var_name = "__var_get_topic"
-        if hasattr(self, var_name):
-            if event_name in getattr(self, var_name):
-                return getattr(self, var_name)[event_name]
-        else:
-            setattr(self, var_name, {})
-
-        data = self.get_event_abi(event_name)
-        input_types = list(data["inputs"] | select(lambda x: x["type"]))
-        input_type_string = ",".join(input_types)
-        message = f"{data['name']}({input_type_string})"
-
-        k = sha3.keccak_256()
-        k.update(message.encode("utf-8"))
-
-        _topic = f"0x{k.hexdigest()}"
-
-        getattr(self, var_name)[event_name] = _topic
-        return _topic
+        return f"0x{self.event_topics[event_name].hex()}"
 
     def __str__(self):
         return f"{self.contract_address} on {self.environment} with {self.abi_path}"
@@ -354,11 +357,24 @@ class Contract(object):
         return {field: self.__dict__[field] for field in fields}
 
 
+# (environment, contract_address, abi_path) => Contract
+ContractInstanceMap: Dict[tuple, Contract] = {}
+_contract_instance_lock = threading.Lock()
+
+
 def get_contract_instance(**kwargs):
-    contract_instance = Contract(
-        contract_address=kwargs["contract_address"],
-        environment=kwargs["environment"],
-        abi_path=kwargs["abi_path"],
-    )
+    """Shared Contract per (environment, address, abi_path), built on first use"""
+    key = (kwargs["environment"], kwargs["contract_address"], kwargs["abi_path"])
+    contract_instance = ContractInstanceMap.get(key)
+    if contract_instance is None:
+        with _contract_instance_lock:
+            contract_instance = ContractInstanceMap.get(key)
+            if contract_instance is None:
+                contract_instance = Contract(
+                    contract_address=kwargs["contract_address"],
+                    environment=kwargs["environment"],
+                    abi_path=kwargs["abi_path"],
+                )
+                ContractInstanceMap[key] = contract_instance
 
     return contract_instance
@@ -0,0 +1,156 @@
+"""
+Wake-up sources for the bots of a `runtime.KeeperRuntime`.
+
+NewBlockTrigger wakes up every bot when a block lands. It follows the `newHeads`
+subscription of WS_RPC and falls back to polling `eth_blockNumber` when there's
+no WebSocket endpoint or the subscription keeps failing. Blocks landing less
+than BLOCK_TRIGGER_MIN_INTERVAL apart are coalesced into one wake-up, so fast
+chains don't start a round per block. ExpiryTrigger wakes up the close bot as
+soon as an option expires, as expirations don't coincide with blocks.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+
+import websockets
+from utility import get_web3
+
+logger = logging.getLogger(__name__)
+
+BLOCK_POLL_INTERVAL = float(os.environ.get("BLOCK_POLL_INTERVAL", 0.25))
+# Shortest time between two wake-ups, in seconds
+BLOCK_TRIGGER_MIN_INTERVAL = float(os.environ.get("BLOCK_TRIGGER_MIN_INTERVAL", 0.5))
+WS_RECONNECT_DELAY = 1
+# Subscription failures in a row before falling back to polling
+WS_MAX_FAILURES = 3
+# How long to poll before trying to subscribe again, in seconds
+WS_RETRY_INTERVAL = 60
+
+EXPIRY_TRIGGER_HORIZON = 10
+EXPIRY_TRIGGER_POLL_INTERVAL = 1
+
+
+class NewBlockTrigger:
+    def __init__(self, environment, ws_url=None):
+        self.environment = environment
+        self.ws_url = ws_url or os.environ.get("WS_RPC")
+        self.block_number = None
+        self.failures = 0
+        self.woken_up_at = float("-inf")
+        self.pending_wake_up = None
+
+    def wake_up(self, notify):
+        self.pending_wake_up = None
+        self.woken_up_at = asyncio.get_running_loop().time()
+        notify()
+
+    def on_block(self, block_number, notify):
+        if self.block_number is not None and block_number <= self.block_number:
+            return
+        self.block_number = block_number
+        if self.pending_wake_up is not None:
+            # The wake-up already scheduled covers this block too
+            return
+
+        loop = asyncio.get_running_loop()
+        delay = self.woken_up_at + BLOCK_TRIGGER_MIN_INTERVAL - loop.time()
+        if delay <= 0:
+            self.wake_up(notify)
+        else:
+            self.pending_wake_up = loop.call_later(delay, self.wake_up, notify)
+
+    async def subscribe(self, notify):
+        async with websockets.connect(self.ws_url) as ws:
+            await ws.send(
+                json.dumps(
+                    {
+                        "jsonrpc": "2.0",
+                        "id": 1,
+                        "method": "eth_subscribe",
+                        "params": ["newHeads"],
+                    }
+                )
+            )
+            response = json.loads(await ws.recv())
+            if "error" in response:
+                raise ValueError(response["error"])
+            logger.info(f"Subscribed to newHeads: {response['result']}")
+
+            async for message in ws:
+                head = json.loads(message)["params"]["result"]
+                self.failures = 0
+                self.on_block(int(head["number"], 16), notify)
+
+    async def poll(self, notify, until=None):
+        loop = asyncio.get_running_loop()
+        web3 = get_web3(self.environment)
+        while until is None or loop.time() < until:
+            try:
+                block_number = await loop.run_in_executor(
+                    None, lambda: web3.eth.block_number
+                )
+                self.on_block(block_number, notify)
+            except Exception as e:
+                logger.warning(f"Error polling eth_blockNumber: {e}")
+            await asyncio.sleep(BLOCK_POLL_INTERVAL)
+
+    async def run(self, runtime):
+        loop = asyncio.get_running_loop()
+        if not self.ws_url:
+            await self.poll(runtime.notify)
+            return
+
+        while True:
+            if self.failures >= WS_MAX_FAILURES:
+                logger.warning(
+                    f"newHeads unavailable, polling eth_blockNumber for "
+                    f"{WS_RETRY_INTERVAL}s"
+                )
+                await self.poll(runtime.notify, until=loop.time() + WS_RETRY_INTERVAL)
+                self.failures = 0
+
+            try:
+                await self.subscribe(runtime.notify)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"newHeads subscription failed: {e}")
+            self.failures += 1
+            await asyncio.sleep(WS_RECONNECT_DELAY)
+
+
+class ExpiryTrigger:
+    def __init__(self, expiration_index, bot_name="close"):
+        self.expiration_index = expiration_index
+        self.bot_name = bot_name
+
+    def get_next_wake_up(self, now, after):
+        """
+        An option is expired once its expiration second is over, returns the
+        first of those times later than `after`, if any is coming up.
+        """
+        wake_ups = [
+            expiration + 1
+            for _, expiration in self.expiration_index.get_upcoming(
+                now + EXPIRY_TRIGGER_HORIZON
+            )
+            if expiration + 1 > after
+        ]
+        return min(wake_ups, default=None)
+
+    async def run(self, runtime):
+        woken_up_at = time.time()
+        while True:
+            now = time.time()
+            wake_up = self.get_next_wake_up(now, woken_up_at)
+            if wake_up is not None and wake_up <= now:
+                runtime.notify(self.bot_name)
+                woken_up_at = wake_up
+                continue
+
+            timeout = EXPIRY_TRIGGER_POLL_INTERVAL
+            if wake_up is not None:
+                timeout = min(wake_up - now, timeout)
+            await asyncio.sleep(timeout)
@@ -0,0 +1,73 @@
+"""
+Local model of Pyth's update fee.
+
+The fee only depends on the number of price updates carried by the update data,
+so fees are cached by that count and reused until Pyth's fee config changes.
+The config (`getValidTimePeriod` and the fee of a single update) is re-read with
+one multicall at most every FEE_CONFIG_TTL seconds.
+"""
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+import config
+import contract
+from accumulator import get_num_updates
+from multicall import cached_multicall
+
+logger = logging.getLogger(__name__)
+
+FEE_CONFIG_TTL = int(os.environ.get("FEE_CONFIG_TTL", 60))
+pyth_abi = "./abis/Pyth.json"
+
+# environment => {"config": (valid_time_period, single_update_fee), "checked_at", "fees": {num_updates: fee}}
+FeeModelMap = defaultdict(lambda: {"config": None, "checked_at": 0, "fees": {}})
+_fee_model_lock = threading.Lock()
+
+
+def _refresh_fee_config(environment):
+    fee_model = FeeModelMap[environment]
+    if time.time() - fee_model["checked_at"] < FEE_CONFIG_TTL:
+        return
+
+    pyth_address = config.PYTH[environment]
+    valid_time_period, single_update_fee = cached_multicall(
+        [
+            (pyth_address, pyth_abi, "getValidTimePeriod"),
+            (pyth_address, pyth_abi, "getUpdateFee", [b""]),
+        ],
+        environment=environment,
+    )
+    fee_config = (valid_time_period, single_update_fee)
+    if fee_config != fee_model["config"]:
+        if fee_model["config"] is not None:
+            logger.info(
+                f"Pyth fee config changed: {fee_model['config']} => {fee_config}"
+            )
+        fee_model["fees"] = {}
+        fee_model["config"] = fee_config
+    fee_model["checked_at"] = time.time()
+
+
+def get_update_fee(price_update_data, environment):
+    """
+    Fee to be paid for all the update blobs in `price_update_data`. Served from the
+    local model when the same number of updates has been priced before, otherwise
+    priced with a single `getUpdateFee` call over all the blobs.
+    """
+    if not price_update_data:
+        return 0
+
+    with _fee_model_lock:
+        _refresh_fee_config(environment)
+        fees = FeeModelMap[environment]["fees"]
+
+        num_updates = sum(map(get_num_updates, price_update_data))
+        if num_updates not in fees:
+            pyth_contract = contract.ContractRegistryMap[environment][
+                config.PYTH[environment]
+            ]
+            fees[num_updates] = pyth_contract.read("getUpdateFee", price_update_data)
+        return fees[num_updates]
@@ -5,10 +5,11 @@ from typing import Optional, Union
 
 import pytz
 from dateutil.parser import parse
+from provider_pool import ProviderPool
+from rate_limiter import RateLimitedHTTPProvider
 from web3 import Web3
 from web3.exceptions import BlockNotFound
 from web3.middleware import geth_poa_middleware
-from web3.providers.rpc import HTTPProvider
 
 logger = logging.getLogger(__name__)
 
@@ -71,21 +72,77 @@ def are_addresses_equal(address1: Optional[str] = None, address2: Optional[str]
 
 
 import os
+import threading
 
+import requests
+from requests.adapters import HTTPAdapter
 
-def get_web3():
-    provider = HTTPProvider(os.environ.get("RPC"), request_kwargs={"timeout": 10})
+RPC_POOL_CONNECTIONS = int(os.environ.get("RPC_POOL_CONNECTIONS", 4))
+RPC_POOL_MAXSIZE = int(os.environ.get("RPC_POOL_MAXSIZE", 32))
+RPC_TIMEOUT = int(os.environ.get("RPC_TIMEOUT", 10))
+
+# (environment, rpc_url) => Web3
+Web3ClientRegistryMap = {}
+_web3_client_lock = threading.Lock()
+
+
+def get_rpc_session(
+    pool_connections=RPC_POOL_CONNECTIONS, pool_maxsize=RPC_POOL_MAXSIZE
+):
+    """Keep-alive session whose connection pool is shared by every RPC call made
+    through the client it is attached to."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _build_provider(rpc_url):
+    provider = RateLimitedHTTPProvider(
+        rpc_url,
+        request_kwargs={"timeout": RPC_TIMEOUT},
+        session=get_rpc_session(),
+    )
 
     # Remove the default JSON-RPC retry middleware
     # as it correctly cannot handle eth_getLogs block range
     # throttle down.
     provider.middlewares.clear()
+    return provider
+
+
+def _build_web3(rpc_url):
+    # Several comma separated RPCs share the calls through a ProviderPool
+    rpc_urls = rpc_url.split(",")
+    if len(rpc_urls) > 1:
+        provider = ProviderPool(list(map(_build_provider, rpc_urls)))
+    else:
+        provider = _build_provider(rpc_url)
 
     web3 = Web3(provider)
     web3.middleware_onion.inject(geth_poa_middleware, layer=0)
     return web3
 
 
+def get_web3(environment=None, rpc_url=None):
+    """
+    Returns the process-wide Web3 client for (environment, rpc_url). The client
+    and its HTTP session are built once and reused so that every RPC rides the
+    same keep-alive connections.
+    """
+    rpc_url = rpc_url or os.environ.get("RPC")
+    key = (environment, rpc_url)
+    web3 = Web3ClientRegistryMap.get(key)
+    if web3 is None:
+        with _web3_client_lock:
+            web3 = Web3ClientRegistryMap.get(key)
+            if web3 is None:
+                web3 = _build_web3(rpc_url)
+                Web3ClientRegistryMap[key] = web3
+    return web3
+
+
 def get_account(private_key):
     web3 = get_web3()
     return Web3.toChecksumAddress(
@@ -93,8 +150,8 @@ def get_account(private_key):
     )
 
 
-def get_latest_block(provider):
-    block_number = get_web3(provider).eth.blockNumber
+def get_latest_block(environment=None):
+    block_number = get_web3(environment).eth.blockNumber
     return block_number
 
 
@@ -0,0 +1,76 @@
+"""
+Speculatively fetches the price update of every second for the active assets,
+before any trade queued in that second is reported by theGraph, and keeps them
+in `vaa_store`. A trade is resolved at exactly its queue second, so the open
+keeper finds the update it needs in memory in the common case.
+
+All the active feeds of a second are fetched with one Hermes request, about one
+request per second in total.
+"""
+import logging
+import os
+import threading
+import time
+
+from asset_registry import asset_registry
+from data_v2 import _fetch_vaas
+from pipe import select
+from vaa_store import mark_configured_assets, vaa_store
+
+logger = logging.getLogger(__name__)
+
+# Time for Hermes to serve the update of a second once it's over
+VAA_PREFETCH_DELAY = float(os.environ.get("VAA_PREFETCH_DELAY", 1))
+VAA_PREFETCH_RETRY_DELAY = 0.5
+
+
+class SpeculativePrefetcher:
+    def __init__(self, environment, assets=None):
+        """
+        :param assets: assets kept warm from the start, e.g. "BTCUSD,ETHUSD" from
+            VAA_PREFETCH_ASSETS. More are added as the keeper asks VAAs for them.
+        """
+        self.environment = environment
+        mark_configured_assets(assets)
+        self.next_publish_time = int(time.time() - VAA_PREFETCH_DELAY)
+        self.stopped = threading.Event()
+
+    def prefetch(self, publish_time):
+        feed_ids = list(
+            vaa_store.get_active_assets() | select(lambda x: asset_registry.feed_ids[x])
+        )
+        if not feed_ids:
+            return
+        for feed_id, vaa in _fetch_vaas(feed_ids, publish_time).items():
+            asset_id = asset_registry.get_id(feed_id)
+            if asset_id is not None:
+                vaa_store.put(asset_id, publish_time, vaa)
+
+    def run(self):
+        while not self.stopped.is_set():
+            now = time.time()
+            # Seconds that have fallen out of the store aren't worth fetching
+            self.next_publish_time = max(
+                self.next_publish_time, int(now) - vaa_store.window + 1
+            )
+            # A second is over at publish_time + 1
+            fetch_at = self.next_publish_time + 1 + VAA_PREFETCH_DELAY
+            if fetch_at > now:
+                self.stopped.wait(fetch_at - now)
+                continue
+
+            try:
+                self.prefetch(self.next_publish_time)
+                self.next_publish_time += 1
+            except Exception as e:
+                logger.warning(f"Prefetching vaas for {self.next_publish_time}: {e}")
+                self.stopped.wait(VAA_PREFETCH_RETRY_DELAY)
+
+    def start(self):
+        threading.Thread(
+            target=self.run, name=f"vaa-prefetch-{self.environment}", daemon=True
+        ).start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
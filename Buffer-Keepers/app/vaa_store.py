@@ -0,0 +1,102 @@
+"""
+In-process store of the latest seconds of price updates, one ring buffer per
+feed, so its memory is bounded and an update is evicted once it's older than
+VAA_STORE_WINDOW. Filled ahead of time by `vaa_prefetch.SpeculativePrefetcher`
+or `price_stream.HermesPriceStream`, so that `data_v2` serves the VAAs of
+recently queued trades from memory instead of waiting on Hermes.
+
+The store also remembers which assets the keeper asked VAAs for recently, only
+those are kept warm.
+"""
+import os
+import threading
+import time
+
+from asset_registry import asset_registry
+
+# Seconds of updates kept per feed
+VAA_STORE_WINDOW = int(os.environ.get("VAA_STORE_WINDOW", 60))
+# An asset stays active this long after the last VAA asked for it, in seconds
+VAA_STORE_ACTIVE_TTL = int(os.environ.get("VAA_STORE_ACTIVE_TTL", 3600))
+
+
+class VaaRingBuffer:
+    """The update of every second of the last `size` seconds of a feed"""
+
+    def __init__(self, size):
+        self.size = size
+        self.publish_times = [-1] * size
+        self.vaas = [None] * size
+
+    def put(self, publish_time, vaa):
+        slot = publish_time % self.size
+        # The first update of a second is kept, a later one for the same second
+        # doesn't replace a VAA that may already have been handed out
+        if publish_time > self.publish_times[slot]:
+            self.publish_times[slot] = publish_time
+            self.vaas[slot] = vaa
+
+    def get(self, publish_time):
+        slot = publish_time % self.size
+        if self.publish_times[slot] == publish_time:
+            return self.vaas[slot]
+        return None
+
+
+class VaaStore:
+    def __init__(self, window=VAA_STORE_WINDOW):
+        self.window = window
+        self.buffers = [None] * len(asset_registry)  # asset id => VaaRingBuffer
+        self.active_assets = {}  # asset id => last time a VAA was asked for it
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def put(self, asset_id, publish_time, vaa):
+        with self._lock:
+            buffer = self.buffers[asset_id]
+            if buffer is None:
+                buffer = self.buffers[asset_id] = VaaRingBuffer(self.window)
+            buffer.put(publish_time, vaa)
+
+    def get(self, asset_id, publish_time):
+        with self._lock:
+            buffer = self.buffers[asset_id]
+            vaa = buffer.get(publish_time) if buffer is not None else None
+            if vaa is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return vaa
+
+    def mark_active(self, assets):
+        now = time.time()
+        with self._lock:
+            for asset in assets:
+                self.active_assets[asset] = now
+
+    def get_active_assets(self):
+        since = time.time() - VAA_STORE_ACTIVE_TTL
+        with self._lock:
+            for asset, last_used in list(self.active_assets.items()):
+                if last_used < since:
+                    del self.active_assets[asset]
+            return list(self.active_assets)
+
+    def get_stats(self):
+        return {
+            "feeds": sum(buffer is not None for buffer in self.buffers),
+            "active_assets": len(self.active_assets),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+vaa_store = VaaStore()
+
+
+def mark_configured_assets(assets=None):
+    """Marks `assets`, or VAA_PREFETCH_ASSETS, e.g. "BTCUSD,ETHUSD", active"""
+    assets = assets or os.environ.get("VAA_PREFETCH_ASSETS", "")
+    asset_ids = map(asset_registry.get_id, assets.split(","))
+    vaa_store.mark_active(asset_id for asset_id in asset_ids if asset_id is not None)